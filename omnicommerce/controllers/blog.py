@@ -1,7 +1,28 @@
 import frappe
 
+from omnicommerce.utils.cache import VersionedCache
+from omnicommerce.utils.http_cache import conditional_get, make_etag
 
-@frappe.whitelist(allow_guest=True, methods=['POST'])
+# Only its version is used: rotated on every Blog Post change, it changes the ETags of the blog endpoints
+blog_cache = VersionedCache("omnicommerce:blog")
+
+
+def blog_post_on_change(doc, method=None, *args):
+    """Hook on Blog Post, the blog ETags change on the next request"""
+    blog_cache.invalidate()
+
+
+def get_blog_post_etag(limit=10, page=1, filters=None):
+    return make_etag('get_blog_post', blog_cache.get_version(), limit, page, filters)
+
+
+def get_blog_post_detail_etag(route=None):
+    return make_etag('get_blog_post_detail', blog_cache.get_version(), route)
+
+
+# GET as well, so the storefront and the CDN can revalidate with If-None-Match
+@frappe.whitelist(allow_guest=True, methods=['GET', 'POST'])
+@conditional_get(get_blog_post_etag)
 def get_blog_post(limit=10, page=1, filters=None):
     try:
 
@@ -10,8 +31,8 @@ def get_blog_post(limit=10, page=1, filters=None):
         field_keys = [field.fieldname for field in meta.fields]
         field_keys.append('name') # Consider 'name' as a valid key
 
-        if filters is None:
-            filters = {}
+        # Query string arguments come as JSON strings
+        filters = frappe.parse_json(filters) if filters else {}
 
         # Create a new dictionary with only the valid keys and values from the filters
         valid_filters = {key: value for key, value in filters.items() if key in field_keys}
@@ -54,6 +75,7 @@ def get_blog_post(limit=10, page=1, filters=None):
         }
     
 @frappe.whitelist(allow_guest=True, methods=['GET'])
+@conditional_get(get_blog_post_detail_etag)
 def get_blog_post_detail(route=None):
     try:
         # Check if the route is provided
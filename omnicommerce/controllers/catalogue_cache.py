@@ -0,0 +1,184 @@
+import hashlib
+import json
+
+import frappe
+
+from omnicommerce.utils.http_cache import make_etag
+
+CATALOGUE_CACHE_PREFIX = "omnicommerce:catalogue"
+PRICE_BOUNDS_CACHE_PREFIX = "omnicommerce:price_bounds"
+INDEX_VERSION_KEY = "omnicommerce:solr_index_version"
+DEFAULT_CATALOGUE_CACHE_TTL = 300
+
+# Arguments understood by catalogue(), with the value catalogue() assumes when they are missing.
+# Anything not listed here does not change the Solr query and is left out of the cache key.
+CATALOGUE_ARGS_DEFAULTS = {
+    'per_page': '12',
+    'page': '1',
+    'search_term': '*',
+    'category': None,
+    'features': None,
+    'wishlist': None,
+    'family_code': None,
+    'family_name': None,
+    'home': None,
+    'skus': None,
+    'is_in_stock': None,
+    'category_detail': None,
+    'promo_code': None,
+    'min_price': None,
+    'max_price': None,
+    'min_discount_value': None,
+    'max_discount_value': None,
+    'min_discount_percent': None,
+    'max_discount_percent': None,
+    'order_by': None,
+    'order_by_creation_at': None,
+    'order_by_updated_at': None,
+    'is_random': None,
+    'random_seed': None,
+    'profile': None,
+}
+
+# Range filters are only applied when they are greater than zero
+POSITIVE_ONLY_ARGS = (
+    'min_price',
+    'max_price',
+    'min_discount_value',
+    'max_discount_value',
+    'min_discount_percent',
+    'max_discount_percent',
+)
+
+# Search parameters that select the matching documents, the price bounds only depend on these
+FILTER_SEARCH_PARAMS = ('q', 'fq', 'groups', 'family_code', 'family_name', 'features')
+
+# Responses depending on the current user can not be shared
+UNCACHEABLE_ARGS = ('wishlist',)
+
+
+def get_catalogue_cache_ttl():
+    """Seconds a cached catalogue response is kept, 0 disables the cache"""
+    return int(frappe.conf.get("omnicommerce_catalogue_cache_ttl", DEFAULT_CATALOGUE_CACHE_TTL) or 0)
+
+
+def get_catalogue_paging(unified_args):
+    """Return (page, per_page) the way catalogue() reads them: an empty per_page means 1, pages start at 1"""
+    per_page_value = unified_args.get('per_page', 12)
+    per_page = int(per_page_value) if per_page_value else 1
+
+    page_value = unified_args.get('page', 1)
+    page = int(page_value) if page_value else 1
+
+    return max(page, 1), per_page
+
+
+def canonicalize_catalogue_args(unified_args):
+    """Return the catalogue arguments that affect the response, as sorted (key, value) pairs"""
+    # Paging goes in the key as catalogue() parses it, so equal pages share an entry and different ones do not
+    page, per_page = get_catalogue_paging(unified_args)
+    unified_args = {**unified_args, 'page': str(page), 'per_page': str(per_page)}
+
+    canonical = {}
+    for key, default in CATALOGUE_ARGS_DEFAULTS.items():
+        value = unified_args.get(key)
+        if value is None or value == "" or value is False:
+            continue
+
+        value = str(value)
+        if default is not None and value == default:
+            continue
+
+        if key in POSITIVE_ONLY_ARGS:
+            try:
+                if float(value) <= 0:
+                    continue
+            except ValueError:
+                pass
+
+        canonical[key] = value
+
+    return sorted(canonical.items())
+
+
+def get_index_version():
+    """Token changed on every write to the Solr index"""
+    version = frappe.cache().get_value(INDEX_VERSION_KEY)
+    if not version:
+        version = bump_index_version()
+    return version
+
+
+def bump_index_version():
+    version = frappe.generate_hash(length=10)
+    frappe.cache().set_value(INDEX_VERSION_KEY, version)
+    return version
+
+
+def get_catalogue_cache_key(unified_args):
+    """Build the cache key of a catalogue request, None when the request must not be cached"""
+    if not get_catalogue_cache_ttl():
+        return None
+
+    if any(unified_args.get(key) for key in UNCACHEABLE_ARGS):
+        return None
+
+    canonical = canonicalize_catalogue_args(unified_args)
+    digest = hashlib.sha1(json.dumps(canonical).encode()).hexdigest()
+
+    return f"{CATALOGUE_CACHE_PREFIX}:{get_index_version()}:{digest}"
+
+
+def get_catalogue_etag(unified_args):
+    """ETag of a catalogue request, None when the response depends on the user"""
+    if any(unified_args.get(key) for key in UNCACHEABLE_ARGS):
+        return None
+    return make_etag('catalogue', get_index_version(), canonicalize_catalogue_args(unified_args))
+
+
+def get_cached_catalogue(cache_key):
+    if not cache_key:
+        return None
+    return frappe.cache().get_value(cache_key)
+
+
+def set_cached_catalogue(cache_key, response):
+    # Only the catalogue data is shared, never an encoded or 304 HTTP response
+    if not cache_key or not isinstance(response, dict):
+        return
+    frappe.cache().set_value(cache_key, response, expires_in_sec=get_catalogue_cache_ttl())
+
+
+def get_price_bounds_cache_key(search_params):
+    """Build the cache key of the price bounds of a search, from its filters alone.
+
+    Pages, page sizes and sorts of the same filters share one entry.
+    """
+    if not get_catalogue_cache_ttl():
+        return None
+
+    filters = [(key, search_params.get(key)) for key in FILTER_SEARCH_PARAMS if search_params.get(key)]
+    digest = hashlib.sha1(json.dumps(filters, default=str).encode()).hexdigest()
+
+    return f"{PRICE_BOUNDS_CACHE_PREFIX}:{get_index_version()}:{digest}"
+
+
+def get_cached_price_bounds(cache_key):
+    """Return the cached {'min', 'max'} of a search, None when they are not cached"""
+    if not cache_key:
+        return None
+    return frappe.cache().get_value(cache_key)
+
+
+def set_cached_price_bounds(cache_key, price_bounds):
+    if not cache_key:
+        return
+    frappe.cache().set_value(cache_key, price_bounds, expires_in_sec=get_catalogue_cache_ttl())
+
+
+def invalidate_catalogue_cache():
+    """Drop every cached catalogue response and price bounds by moving to a new index version.
+
+    Old entries are never read again and expire on their own TTL.
+    """
+    bump_index_version()
@@ -0,0 +1,108 @@
+import json
+
+import frappe
+
+from omnicommerce.controllers.item_group_tree import GROUP_FIELD_PREFIX
+
+PRICE_FIELD = 'net_price_with_vat'
+DISCOUNT_FIELD = 'discount_percent'
+DEFAULT_FEATURE_FACET_FIELD = 'features'
+
+# Price histogram buckets: [from, to), None for no upper bound. Fixed, so every page
+# and sort of a listing shows the same histogram. Empty buckets at both ends are left out
+PRICE_RANGES = (
+    (0, 10), (10, 20), (20, 50), (50, 100), (100, 200),
+    (200, 500), (500, 1000), (1000, 2000), (2000, 5000), (5000, None),
+)
+
+# Discount percent buckets: [from, to), None for no upper bound
+DISCOUNT_RANGES = ((0, 10), (10, 20), (20, 30), (30, 50), (50, None))
+
+
+def is_json_facet_enabled():
+    return bool(frappe.conf.get("omnicommerce_json_facets"))
+
+
+def get_feature_facet_field():
+    return frappe.conf.get("omnicommerce_feature_facet_field") or DEFAULT_FEATURE_FACET_FIELD
+
+
+def get_range_facet_name(prefix, lower, upper):
+    return f"{prefix}_{lower}_{upper if upper is not None else 'up'}"
+
+
+def get_range_query(field, lower, upper):
+    upper_bound = f'{upper}}}' if upper is not None else '*]'
+    return f'{field}:[{lower} TO {upper_bound}'
+
+
+class JsonFacetRequest:
+    """One JSON Facet request for the catalogue: category and feature counts, price bounds,
+    price histogram and discount ranges, in place of the facet and stats components.
+
+    :param groups: str - the selected category slugs, the category facet counts the next level
+    """
+
+    def __init__(self, groups=None):
+        level = len([slug for slug in (groups or '').split(',') if slug]) + 1
+        self.category_field = f'{GROUP_FIELD_PREFIX}{level}'
+
+    def build(self):
+        facet = {
+            'category': {'type': 'terms', 'field': self.category_field, 'limit': -1, 'mincount': 1},
+            'features': {'type': 'terms', 'field': get_feature_facet_field(), 'limit': -1, 'mincount': 1},
+            'price_min': f'min({PRICE_FIELD})',
+            'price_max': f'max({PRICE_FIELD})',
+        }
+        for lower, upper in PRICE_RANGES:
+            facet[get_range_facet_name('price', lower, upper)] = {'type': 'query', 'q': get_range_query(PRICE_FIELD, lower, upper)}
+        for lower, upper in DISCOUNT_RANGES:
+            facet[get_range_facet_name('discount', lower, upper)] = {'type': 'query', 'q': get_range_query(DISCOUNT_FIELD, lower, upper)}
+        return facet
+
+    def add_to(self, search_params):
+        """Ask for the JSON facets instead of the facet and stats components"""
+        search_params['json.facet'] = json.dumps(self.build())
+        search_params['facet'] = 'false'
+        search_params.pop('stats', None)
+        search_params.pop('stats.field', None)
+        return search_params
+
+    def map(self, facets):
+        """Map the `facets` section of the Solr response to the catalogue response keys"""
+        facets = facets or {}
+
+        price_histogram = get_range_counts(facets, 'price', PRICE_RANGES)
+        # Trim the empty buckets below the cheapest and above the most expensive product
+        while price_histogram and not price_histogram[0]['count']:
+            price_histogram.pop(0)
+        while price_histogram and not price_histogram[-1]['count']:
+            price_histogram.pop()
+
+        return {
+            # Same {value: count} shape as the category and feature counts of the facet component
+            'category': get_bucket_counts(facets.get('category')),
+            'features': get_bucket_counts(facets.get('features')),
+            # No price aggregation when nothing matched
+            'price_bounds': {'min': facets.get('price_min'), 'max': facets.get('price_max')},
+            'price_histogram': price_histogram,
+            'discount_ranges': get_range_counts(facets, 'discount', DISCOUNT_RANGES),
+        }
+
+
+def get_range_counts(facets, prefix, ranges):
+    return [
+        {'from': lower, 'to': upper, 'count': (facets.get(get_range_facet_name(prefix, lower, upper)) or {}).get('count', 0)}
+        for lower, upper in ranges
+    ]
+
+
+def get_bucket_counts(facet):
+    """{value: count} of a terms facet, in count order"""
+    return {bucket['val']: bucket['count'] for bucket in (facet or {}).get('buckets', [])}
+
+
+def get_json_facets(solr_results):
+    """The `facets` section of the raw Solr response"""
+    raw_response = getattr(solr_results.get('response'), 'raw_response', None) or {}
+    return raw_response.get('facets')
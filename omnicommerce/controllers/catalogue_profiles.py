@@ -0,0 +1,71 @@
+import frappe
+from frappe import _
+
+from omnicommerce.controllers.item_group_tree import GROUP_FIELDS
+
+PRICE_FIELDS = [
+    'uom',
+    'sales_uom',
+    'sales_uom_conversion_factor',
+    'gross_price',
+    'gross_price_with_vat',
+    'net_price',
+    'net_price_with_vat',
+    'promo_price',
+    'promo_price_with_vat',
+    'is_promo',
+    'discount_type',
+    'discount_value',
+    'discount_percent',
+]
+
+# Named shapes of the catalogue() payload.
+#   fields: Solr fields requested through `fl` and filled by map_solr_response_b2c, None for all of them
+#   include_solr_result: whether the raw Solr documents are returned next to the mapped products
+CATALOGUE_PROFILES = {
+    # What the storefront product grid renders
+    'listing': {
+        'fields': [
+            'id', 'sku', 'name', 'short_description', 'slug', 'images', 'num_images', 'availability',
+            'family_code', 'family_name', *GROUP_FIELDS, *PRICE_FIELDS,
+        ],
+        'include_solr_result': False,
+    },
+    # Every stored field, for product pages
+    'detail': {
+        'fields': None,
+        'include_solr_result': False,
+    },
+    # What the merchant feeds need, descriptions included
+    'export': {
+        'fields': [
+            'id', 'sku', 'name', 'short_description', 'description', 'slug', 'images', 'num_images',
+            'availability', *GROUP_FIELDS, *PRICE_FIELDS,
+        ],
+        'include_solr_result': False,
+    },
+}
+
+# Used when no profile is requested, keeps the historical payload
+DEFAULT_CATALOGUE_PROFILE = {
+    'fields': None,
+    'include_solr_result': True,
+}
+
+
+def get_catalogue_profile(profile_name=None):
+    if not profile_name:
+        return DEFAULT_CATALOGUE_PROFILE
+
+    profile = CATALOGUE_PROFILES.get(profile_name)
+    if profile is None:
+        frappe.throw(_('Unknown catalogue profile {0}').format(profile_name), frappe.ValidationError)
+
+    return profile
+
+
+def add_profile_field_list(search_params, profile):
+    """Ask Solr only for the stored fields the profile maps"""
+    if profile['fields']:
+        search_params['fl'] = ','.join(profile['fields'])
+    return search_params
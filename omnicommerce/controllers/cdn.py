@@ -0,0 +1,205 @@
+"""
+CDN caching of the storefront responses.
+
+catalogue and products responses carry `Cache-Control` and a `Surrogate-Key` header
+listing what they show: `sku:<sku>` for each product, `category:<slugs>` for a
+category listing and `catalogue:all` for listings not restricted to a category. Every catalogue
+response also gets `catalogue`, every product page `product`, and every response
+`omnicommerce`, to purge everything at once.
+
+Index writes call purge_document_pages() and purge_all_pages(). Changes to the B2C
+Menus, Item Groups and feature UOMs the responses embed purge every catalogue page,
+and the product pages for features. The keys go to the purge backend set in site config:
+
+    "omnicommerce_cdn_purge": {"backend": "http", "url": "https://...", "headers": {...}}
+
+- "http": POST {"surrogate_keys": [...]} to url, from a background job
+- "local": record the purges in Redis, read them back with get_local_purge_events()
+- a dotted path: call that function with the list of keys
+"""
+import json
+from functools import wraps
+
+import frappe
+import requests
+
+from omnicommerce.controllers.item_group_tree import GROUP_FIELDS, slugify_item_group
+from omnicommerce.utils.fast_json import outermost_requested_call
+
+GLOBAL_SURROGATE_KEY = 'omnicommerce'
+CATALOGUE_SURROGATE_KEY = 'catalogue'
+PRODUCT_PAGE_SURROGATE_KEY = 'product'
+ALL_LISTINGS_SURROGATE_KEY = 'catalogue:all'
+# Past this many keys the SKU keys of a response are dropped, the category keys still purge the page.
+# Purges are sent in chunks of this size too
+MAX_SURROGATE_KEYS = 500
+DEFAULT_CDN_MAX_AGE = 300
+LOCAL_PURGE_EVENTS_KEY = "omnicommerce:cdn_purge_events"
+LOCAL_PURGE_EVENTS_SIZE = 1000
+DEFAULT_PURGE_TIMEOUT = 5
+
+
+def get_sku_key(sku):
+    return f'sku:{sku}'
+
+
+def get_category_key(slugs):
+    return f"category:{','.join(slugs)}"
+
+
+def get_document_surrogate_keys(document):
+    """Keys of the pages a Solr document may show up in: its own and those of its category paths"""
+    keys = [ALL_LISTINGS_SURROGATE_KEY]
+    sku = document.get('sku') or document.get('id')
+    if sku:
+        keys.append(get_sku_key(sku))
+
+    slugs = []
+    for field in GROUP_FIELDS:
+        group = document.get(field)
+        if not group or not isinstance(group, str):
+            break
+        slugs.append(slugify_item_group(group))
+        keys.append(get_category_key(slugs))
+
+    return keys
+
+
+def get_catalogue_surrogate_keys(unified_args, response):
+    """Keys of a catalogue page: the category it lists and the products it shows"""
+    category = unified_args.get('category')
+    if category:
+        listing_key = get_category_key(slug.lower() for slug in category.split(',') if slug)
+    else:
+        listing_key = ALL_LISTINGS_SURROGATE_KEY
+
+    skus = [product.get('sku') for product in response.get('products') or []]
+    return get_response_surrogate_keys([CATALOGUE_SURROGATE_KEY, listing_key], skus)
+
+
+def get_product_page_surrogate_keys(response):
+    """Keys of a product page: the product and the products of its carousels"""
+    products = [response.get('product') or {}]
+    for carousel in ('relatedProducts', 'featuredProducts', 'bestSellingProducts'):
+        products.extend(response.get(carousel) or [])
+
+    return get_response_surrogate_keys([PRODUCT_PAGE_SURROGATE_KEY], [product.get('sku') for product in products])
+
+
+def get_response_surrogate_keys(keys, skus):
+    keys = [GLOBAL_SURROGATE_KEY, *keys]
+    sku_keys = list(dict.fromkeys(get_sku_key(sku) for sku in skus if sku))
+    if len(keys) + len(sku_keys) <= MAX_SURROGATE_KEYS:
+        keys.extend(sku_keys)
+    return keys
+
+
+def cdn_cacheable(get_keys):
+    """
+    Mark the response of a whitelisted method as cacheable by the CDN, tagged with get_keys(data, *args).
+
+    get_keys returns None for responses that must not be shared. Only applies to
+    the outermost call of the method called by the HTTP request.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with outermost_requested_call(fn, 'cdn_cacheable') as outermost:
+                data = fn(*args, **kwargs)
+            if outermost and isinstance(data, dict):
+                frappe.local.omnicommerce_surrogate_keys = get_keys(data, *args, **kwargs)
+            return data
+
+        return wrapper
+
+    return decorator
+
+
+def get_cdn_max_age():
+    return int(frappe.conf.get("omnicommerce_cdn_max_age", DEFAULT_CDN_MAX_AGE) or 0)
+
+
+def add_cdn_headers(response=None, request=None):
+    """after_request hook, send the Cache-Control and Surrogate-Key headers of cacheable responses"""
+    if response is None or not hasattr(frappe.local, 'omnicommerce_surrogate_keys'):
+        return
+    if response.status_code not in (200, 304):
+        return
+
+    keys = frappe.local.omnicommerce_surrogate_keys
+    max_age = get_cdn_max_age()
+    if not keys or not max_age:
+        response.headers['Cache-Control'] = 'private, no-store'
+        return
+
+    # Browsers revalidate with the ETag, the CDN keeps the page until it is purged or expires
+    response.headers['Cache-Control'] = f'public, max-age=0, s-maxage={max_age}'
+    response.headers['Surrogate-Key'] = ' '.join(keys)
+
+
+def get_purge_settings():
+    settings = frappe.conf.get("omnicommerce_cdn_purge") or {}
+    if isinstance(settings, str):
+        settings = json.loads(settings)
+    return settings
+
+
+def purge_surrogate_keys(keys):
+    """Hand the keys to the configured purge backend, in chunks of MAX_SURROGATE_KEYS, does nothing without one"""
+    keys = list(dict.fromkeys(key for key in keys if key))
+    settings = get_purge_settings()
+    backend = settings.get('backend')
+    if not keys or not backend:
+        return
+
+    for offset in range(0, len(keys), MAX_SURROGATE_KEYS):
+        chunk = keys[offset:offset + MAX_SURROGATE_KEYS]
+        if backend == 'local':
+            record_local_purge(chunk)
+        elif backend == 'http':
+            # Index writes do not wait for the CDN
+            frappe.enqueue("omnicommerce.controllers.cdn.send_http_purge", queue="short", keys=chunk)
+        else:
+            frappe.get_attr(backend)(chunk)
+
+
+def purge_document_pages(document):
+    """Purge the pages showing a document added, updated or deleted in the index"""
+    if document:
+        purge_surrogate_keys(get_document_surrogate_keys(document))
+
+
+def purge_all_pages():
+    purge_surrogate_keys([GLOBAL_SURROGATE_KEY])
+
+
+def catalogue_data_on_change(doc, method=None, *args):
+    """Hook on B2C Menu and Item Group: catalogue pages embed the menu details, category labels and trees"""
+    purge_surrogate_keys([CATALOGUE_SURROGATE_KEY])
+
+
+def feature_data_on_change(doc, method=None, *args):
+    """Hook on the feature DocTypes: catalogue facets and product page features show them"""
+    purge_surrogate_keys([CATALOGUE_SURROGATE_KEY, PRODUCT_PAGE_SURROGATE_KEY])
+
+
+def send_http_purge(keys):
+    settings = get_purge_settings()
+    response = requests.post(
+        settings['url'],
+        json={'surrogate_keys': keys},
+        headers=settings.get('headers') or {},
+        timeout=settings.get('timeout') or DEFAULT_PURGE_TIMEOUT,
+    )
+    response.raise_for_status()
+
+
+def record_local_purge(keys):
+    """Purge stub: keep the purged keys in a capped Redis list"""
+    frappe.cache().lpush(LOCAL_PURGE_EVENTS_KEY, json.dumps(keys))
+    frappe.cache().ltrim(LOCAL_PURGE_EVENTS_KEY, 0, LOCAL_PURGE_EVENTS_SIZE - 1)
+
+
+def get_local_purge_events():
+    """Keys purged through the local backend, most recent first"""
+    return [json.loads(event) for event in frappe.cache().lrange(LOCAL_PURGE_EVENTS_KEY, 0, -1)]
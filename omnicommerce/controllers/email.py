@@ -4,7 +4,7 @@ from omnicommerce.controllers.pdf import get_pdf_data
 from omnicommerce.controllers.pdf import get_default_letterhead
 from frappe.utils.file_manager import save_file
 from mymb_ecommerce.settings.configurations import Configurations
-from omnicommerce.controllers.solr_search import catalogue as catalogue_omnicommerce
+from omnicommerce.controllers.solr_search import get_catalogue
 from mymb_ecommerce.mymb_b2c.solr_search import catalogue as  catalogue_mymb
 
 from mymb_ecommerce.mymb_b2c.settings.configurations import Configurations as ConfigurationsB2C
@@ -134,7 +134,8 @@ def send_sales_order_confirmation_email_html(sales_order=None, name=None  , reci
     skus = ";".join([item.item_code for item in sales_order.items if item.item_code])
     # Retrieve catalogue information if skus exist
     if not config_b2c.enable_mymb_b2c:
-        extra_info = catalogue_omnicommerce(args={"skus": skus, "per_page": 999})
+        # Same keys as the mymb catalogue, the templates may use any of them. SKU lists are paged in order
+        extra_info = get_catalogue({"skus": skus, "per_page": 999})
     else:
         extra_info = catalogue_mymb(args={"skus": skus, "per_page": 999})
 
@@ -0,0 +1,106 @@
+import hashlib
+import json
+from numbers import Number
+
+import frappe
+from mymb_ecommerce.mymb_ecommerce.item_feature import map_feature_with_uom_via_family_code
+
+from omnicommerce.utils.cache import VersionedCache
+from omnicommerce.controllers.catalogue_cache import invalidate_catalogue_cache
+
+FEATURE_UOM_CACHE_TTL = 86400
+
+# DocTypes holding the feature definitions and their units of measure. Saving or deleting
+# one of them drops the cache, see doc_events in hooks.py
+FEATURE_DOCTYPES = ("Item Feature", "UOM")
+
+feature_uom_cache = VersionedCache("omnicommerce:feature_uom", maxsize=512, ttl=FEATURE_UOM_CACHE_TTL)
+
+
+class FacetCount(int):
+    """A facet count that remembers where it was in the facets, to find it in the decoration"""
+
+    def __new__(cls, value, path):
+        count = super().__new__(cls, value)
+        count.path = path
+        return count
+
+    def __reduce__(self):
+        return FacetCount, (int(self), self.path)
+
+
+def is_count(value):
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def get_facet_names(facets):
+    """The facets with their counts left out: the names and values the UOM decoration depends on"""
+    if isinstance(facets, dict):
+        return {str(key): get_facet_names(value) for key, value in facets.items()}
+    if isinstance(facets, (list, tuple)):
+        return [get_facet_names(value) for value in facets]
+    return None if is_count(facets) else facets
+
+
+def get_facet_counts(facets, path=()):
+    """{path: count} of every count in the facets"""
+    if isinstance(facets, dict):
+        items = facets.items()
+    elif isinstance(facets, (list, tuple)):
+        items = enumerate(facets)
+    else:
+        return {path: facets} if is_count(facets) else {}
+
+    counts = {}
+    for key, value in items:
+        counts.update(get_facet_counts(value, path + (str(key),)))
+    return counts
+
+
+def tag_facet_counts(facets, path=()):
+    """Copy of the facets with each count replaced by a FacetCount of its path"""
+    if isinstance(facets, dict):
+        return {key: tag_facet_counts(value, path + (str(key),)) for key, value in facets.items()}
+    if isinstance(facets, (list, tuple)):
+        return [tag_facet_counts(value, path + (str(index),)) for index, value in enumerate(facets)]
+    return FacetCount(facets, path) if is_count(facets) else facets
+
+
+def set_facet_counts(decorated, counts):
+    """Put the counts of the request in place of the FacetCounts of a cached decoration"""
+    if isinstance(decorated, dict):
+        return {key: set_facet_counts(value, counts) for key, value in decorated.items()}
+    if isinstance(decorated, (list, tuple)):
+        return [set_facet_counts(value, counts) for value in decorated]
+    if isinstance(decorated, FacetCount):
+        return counts.get(decorated.path, int(decorated))
+    return decorated
+
+
+def map_feature_with_uom_cached(features, search_results_mapped):
+    """
+    Decorate the feature facets with their unit of measure, through the feature UOM cache.
+
+    The UOMs only depend on the families of the products found and on the facet names,
+    so the output of map_feature_with_uom_via_family_code is kept per family set and facet
+    names. The counts go through it as FacetCounts, replaced by those of the request on the
+    way out, so the output keeps the shape that function gives it. One cache read per request.
+    """
+    if not features:
+        return features
+
+    family_codes = sorted({str(product['family_code']) for product in search_results_mapped if product.get('family_code')})
+    fingerprint = json.dumps([family_codes, get_facet_names(features)], sort_keys=True, default=str)
+    cache_key = hashlib.sha1(fingerprint.encode()).hexdigest()
+
+    decorated = feature_uom_cache.get(
+        cache_key, lambda: map_feature_with_uom_via_family_code(tag_facet_counts(features), search_results_mapped)
+    )
+    return set_facet_counts(decorated, get_facet_counts(features))
+
+
+def feature_doctype_on_change(doc, method=None):
+    """Hook on FEATURE_DOCTYPES, drops the feature UOM cache when a feature definition changes"""
+    feature_uom_cache.invalidate()
+    # Cached catalogue pages and their ETags embed the decorated features
+    invalidate_catalogue_cache()
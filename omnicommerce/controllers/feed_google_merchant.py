@@ -1,6 +1,6 @@
 from mymb_ecommerce.utils.Media import Media
 from mymb_ecommerce.mymb_b2c.settings.configurations import Configurations
-from omnicommerce.controllers.solr_search import catalogue
+from omnicommerce.controllers.solr_search import get_catalogue, iter_catalogue
 from omnicommerce.controllers.pdf import create_folder_structure
 from mymb_ecommerce.repository.MyBarcodRepository import MyBarcodRepository
 from mymb_ecommerce.repository.MyPrecodRepository import MyPrecodRepository
@@ -14,6 +14,10 @@ import re
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 import json
+from itertools import islice
+from frappe.utils import cint
+
+DEFAULT_EXPORT_BATCH_SIZE = 250
 
 def sanitize_text(text):
     """Remove control characters and NULL bytes from text."""
@@ -51,11 +55,12 @@ def init_feed_generation( folder , file_name ,feed_type , args=None , limit = 10
     new_feed.insert(ignore_permissions=True)
 
     extra_args= {
-        "per_page":limit #is going to be the max number of item to procces
+        "per_page":limit, #is going to be the max number of item to procces
+        "profile":"export"
     }
     unified_args = {**extra_args, **args}
     # Get the products list from the catalogue function
-    result = catalogue(unified_args)  # Ensure this returns a list of product dictionaries
+    result = get_catalogue(unified_args)  # Ensure this returns a list of product dictionaries
     products = result.get("products" , {})
 
     ids = []
@@ -243,69 +248,55 @@ def upload_to_google_merchant_create_product(args , merchant_id, credentials_jso
     b2c_name = config.b2c_title if config.b2c_title else 'Shop'
     b2c_url = config.b2c_url if config.b2c_url else 'https://www.omnicommerce.cloud'
 
-    # Pagination setup
-    page = starting_page
-    total_count = 0
+    # Stream the whole catalogue with a cursor: deep pages cost the same as the first one
+    per_page = cint(per_page) or DEFAULT_EXPORT_BATCH_SIZE
+    batch_size = cint(batch_size) or per_page
+    limit = cint(limit)
     processed_count = 0
 
-    while True:
-        extra_args = {"per_page": per_page, "page": page}
-        unified_args = {**extra_args, **(args or {})}
-        result = catalogue(unified_args)
-
-        if page ==starting_page:
-                total_count = result.get("totalCount", 0)
+    products = iter_catalogue(args, batch_size=per_page)
+    skipped_products = (cint(starting_page) - 1) * per_page
+    if skipped_products > 0:
+        products = islice(products, skipped_products, None)
 
-        products = result.get("products", [])
-        if not products:
+    batch_requests = []
+    for product in products:
+        google_product = map_google_item(product, b2c_url)
+        batch_requests.append({
+            'batchId': len(batch_requests),
+            'merchantId': merchant_id,
+            'method': 'insert',
+            'product': google_product
+        })
+        processed_count += 1
+
+        if len(batch_requests) == batch_size:
+            send_google_merchant_batch(service, batch_requests, responses)
+            print(processed_count)
+            batch_requests = []  # Reset for next batch
+
+        if limit and processed_count >= limit:
             break
 
-        ids = [product['id'] for product in products]
-
-
-
-
-        batch_requests = []
-        for i, product in enumerate(products):
-            
-            
-            google_product = map_google_item(product, b2c_url)
-            batch_requests.append({
-                'batchId': i,
-                'merchantId': merchant_id,
-                'method': 'insert',
-                'product': google_product
-            })
-            processed_count += 1
-
-            if len(batch_requests) == batch_size or i == len(products) - 1:
-                try:
-                    # Send batch request
-                    batch_response = service.products().custombatch(body={'entries': batch_requests}).execute()
-                    responses.extend(batch_response.get('entries', []))
-                    print(processed_count)
-                except Exception as e:
-                    print(f"Error during batch request: {e}")
-                    # Optionally, log the error or handle it as needed
-                    # You can also append the error to the responses list if you want to keep track of it
-                    responses.append({'error': str(e), 'batch': batch_requests})
-                finally:
-                    batch_requests = []  # Reset for next batch
-            
-            if processed_count >=limit:
-                return {
-                    "processed_count":processed_count
-                }
-            
-        if total_count==processed_count:
-            break
-        # Increment the page number for the next iteration
-        page += 1
+    if batch_requests:
+        send_google_merchant_batch(service, batch_requests, responses)
+        print(processed_count)
 
     return {
         "processed_count":processed_count
     }
 
+
+def send_google_merchant_batch(service, batch_requests, responses):
+    try:
+        # Send batch request
+        batch_response = service.products().custombatch(body={'entries': batch_requests}).execute()
+        responses.extend(batch_response.get('entries', []))
+    except Exception as e:
+        print(f"Error during batch request: {e}")
+        # Keep track of the failed batch in the responses list
+        responses.append({'error': str(e), 'batch': batch_requests})
+
 def get_short_description(item_code):
     try:
         # Fetch the Website Item document using the item_code
@@ -1,13 +1,14 @@
 
 import frappe
-from omnicommerce.controllers.solr_crud import add_document_to_solr
+from omnicommerce.controllers.solr_crud import index_documents_in_solr, delete_document_to_solr
+from omnicommerce.controllers.item_group_tree import get_item_group_path
+from omnicommerce.utils.fast_json import fast_json_response
 from datetime import datetime
 from webshop.webshop.shopping_cart.product_info import get_product_info_for_website
 from mymb_ecommerce.mymb_b2c.settings.configurations import Configurations
 from bs4 import BeautifulSoup
 from frappe.utils import cint, flt, fmt_money
 from slugify import slugify
-from mymb_ecommerce.controllers.solr_crud import delete_document_to_solr
 from erpnext.accounts.doctype.pricing_rule.pricing_rule import get_pricing_rule_for_item
 from mymb_ecommerce.mymb_b2c.settings.configurations import Configurations
 
@@ -22,6 +23,7 @@ from webshop.webshop.doctype.webshop_settings.webshop_settings import (
 from webshop.webshop.shopping_cart.cart import  _set_price_list
 
 @frappe.whitelist(allow_guest=True, methods=['POST'])
+@fast_json_response
 def get_website_items(limit=None, page=1, filters=None):
     try:
 
@@ -47,16 +49,17 @@ def get_website_items(limit=None, page=1, filters=None):
         items_data = []
         cart_settings = get_shopping_cart_settings()
         selling_price_list = _set_price_list(cart_settings, None)
+        # Prices of the whole page in a few queries, instead of several per item
+        prices_by_item = get_prices_bulk([website_item.item_code for website_item in filtered_website_items], selling_price_list, cart_settings.default_customer_group, cart_settings.company)
         for website_item in filtered_website_items:
             product = get_product_info_for_website(item_code=website_item.item_code , skip_quotation_creation=True)
-            item_group = get_item_group_groups(item_code=website_item.item_code)
+            item_group = get_item_group_groups(item_code=website_item.item_code, item_group=website_item.get('item_group'))
             merged_data = {
                 **website_item,
                 **product,
                 'groups':item_group
             }
-            prices = get_price(website_item.item_code,selling_price_list, cart_settings.default_customer_group, cart_settings.company)
-            merged_data['prices'] = prices
+            merged_data['prices'] = prices_by_item.get(website_item.item_code)
             slideshow_items = None
 
             if website_item.slideshow:
@@ -90,20 +93,13 @@ def get_website_items(limit=None, page=1, filters=None):
         }
 
 
-def get_item_group_groups(item_code):
+def get_item_group_groups(item_code, item_group=None):
+    # Item Group of the item, unless the caller already knows it
+    if not item_group:
+        item_group = frappe.get_value('Item', item_code, 'item_group')
 
-    config = Configurations()
-    b2c_item_group = config.default_item_group if config.default_item_group else 'All Item Groups'
-    item_group = frappe.get_value('Item', item_code, 'item_group')
-    groups_list = []
-
-    # Traverse up the item group tree and collect all item groups
-    while item_group and item_group != b2c_item_group:
-        groups_list.append(item_group)
-        item_group = frappe.get_value('Item Group', item_group, 'parent_item_group')
-
-    # Reverse the list so that the last group is first
-    groups_list = groups_list[::-1]
+    # Ancestor path below the B2C root, from the precomputed Item Group tree
+    groups_list = get_item_group_path(item_group)
 
     # Create the groups dictionary with appropriate keys
     groups = {}
@@ -124,12 +120,17 @@ def get_slideshow_for_website(slideshow_name):
 @frappe.whitelist(allow_guest=True, methods=['POST'])
 def import_website_items_in_solr(limit=None, page=None, filters=None):
     items = get_website_items(limit=limit, page=page, filters=filters)
+    return index_website_items(items["data"])
 
+
+def index_website_items(website_items):
+    """Transform get_website_items() rows into Solr documents and index them, reporting per SKU"""
     success_items = []
     failure_items = []
     skipped_items = []
 
-    for item in items["data"]:
+    documents = []
+    for item in website_items:
         solr_document = transform_to_solr_document(item)
 
         if solr_document is None or not solr_document.get('name') or not solr_document.get('images'):
@@ -139,12 +140,15 @@ def import_website_items_in_solr(limit=None, page=None, filters=None):
             frappe.log_error(f"Warning: Skipped Item in solr  SKU: {sku} , D: {solr_id}  to Solr", f"Skipped document with SKU: {sku} due to missing name  or images. {solr_document}")
             continue
 
-        result = add_document_to_solr(solr_document)
+        documents.append(solr_document)
+
+    # Batched update requests and one commit, instead of a hard commit per item
+    for solr_document, result in index_documents_in_solr(documents):
         if result['status'] == 'success':
             success_items.append(solr_document['sku'])
         else:
             failure_items.append(solr_document['sku'])
-            frappe.log_error(title=f"Error: Import Item in solr SKU: {solr_document['sku']} ID: {solr_document['id']} ", message=f"Failed to add document with SKU: {solr_document['sku']} to Solr. Reason: {result['reason']}")
+            frappe.log_error(title=f"Error: Import Item in solr SKU: {solr_document['sku']} ID: {solr_document['id']} ", message=f"Failed to add document with SKU: {solr_document['sku']} to Solr. Reason: {result.get('reason')}")
 
     return {
         "data": {
@@ -329,33 +333,38 @@ def transform_to_solr_document(item):
 
 
 def get_price(item_code, price_list, customer_group, company, qty=1):
-    from webshop.webshop.shopping_cart.cart import get_party
+    return get_prices_bulk([item_code], price_list, customer_group, company, qty).get(item_code)
 
-    template_item_code = frappe.db.get_value("Item", item_code, "variant_of")
 
-    # Step 1: Fetch Base Price (Without Pricing Rule)
-    price = frappe.get_all(
-        "Item Price",
-        fields=["price_list_rate", "currency", "uom"],
-        filters={"price_list": price_list, "item_code": item_code},
-    )
+def get_prices_bulk(item_codes, price_list, customer_group, company, qty=1):
+    """
+    Prices of many items at once, with the Item Prices, UOM conversions and tax setup
+    fetched in a handful of set-based queries.
 
-    if template_item_code and not price:
-        price = frappe.get_all(
-            "Item Price",
-            fields=["price_list_rate", "currency", "uom"],
-            filters={"price_list": price_list, "item_code": template_item_code},
-        )
-
-    if not price:
-        return None  # No price found
-
-    price_obj = price[0]
+    :return: dict - {item_code: the get_price dict, or None when the item has no price}
+    """
+    from webshop.webshop.shopping_cart.cart import get_party
 
-    # Store Initial Base Price
-    base_price = flt(price_obj.price_list_rate)
+    item_codes = list(dict.fromkeys(code for code in item_codes if code))
+    if not item_codes:
+        return {}
+
+    # Step 1: Fetch Base Prices (Without Pricing Rule), variants fall back to their template
+    template_by_item = dict(frappe.get_all(
+        "Item",
+        fields=["name", "variant_of"],
+        filters={"name": ["in", item_codes], "variant_of": ["is", "set"]},
+        as_list=True,
+    ))
+    price_by_item = {}
+    for price in frappe.get_all(
+        "Item Price",
+        fields=["item_code", "price_list_rate", "currency", "uom"],
+        filters={"price_list": price_list, "item_code": ["in", item_codes + list(set(template_by_item.values()))]},
+    ):
+        price_by_item.setdefault(price.item_code, price)
 
-    # Step 2: Fetch Applicable Tax
+    # Step 2: Fetch Applicable Tax, the same for every item
     tax_template = frappe.db.get_value(
         "Sales Taxes and Charges Template",
         {"company": company, "is_default": 1},
@@ -370,29 +379,67 @@ def get_price(item_code, price_list, customer_group, company, qty=1):
             "rate"
         ) or 0
 
+    # Sales UOM conversion of every item, applied in Step 4
+    uom_conversion_by_item = {
+        row[0]: (row[1], row[2])
+        for row in frappe.db.sql(
+            """SELECT I.name, C.conversion_factor, I.sales_uom
+            FROM `tabUOM Conversion Detail` C
+            INNER JOIN `tabItem` I ON C.parent = I.name AND C.uom = I.sales_uom
+            WHERE I.name IN %(item_codes)s""",
+            {"item_codes": tuple(item_codes)},
+        )
+    }
+
+    # Without any enabled selling rule the pricing rule engine has nothing to apply
+    has_pricing_rules = bool(frappe.db.exists("Pricing Rule", {"disable": 0, "selling": 1}))
+    party = get_party() if has_pricing_rules else None
+
+    prices = {}
+    for item_code in item_codes:
+        price_obj = price_by_item.get(item_code) or price_by_item.get(template_by_item.get(item_code))
+        if not price_obj:
+            prices[item_code] = None  # No price found
+            continue
+
+        prices[item_code] = build_price(
+            item_code, price_obj, tax_rate, uom_conversion_by_item.get(item_code), party,
+            price_list, customer_group, company, qty, apply_pricing_rule=has_pricing_rules,
+        )
+
+    return prices
+
+
+def build_price(item_code, price_obj, tax_rate, uom_conversion, party, price_list, customer_group, company, qty=1, apply_pricing_rule=True):
+    """The get_price dict of an item from its Item Price, tax rate and (conversion_factor, sales_uom)"""
+
+    # Store Initial Base Price
+    base_price = flt(price_obj.price_list_rate)
+
     tax_amount = (base_price * flt(tax_rate)) / 100.0
     base_price_with_tax = base_price + tax_amount
 
     # Step 3: Apply Pricing Rule
-    party = get_party()
-    pricing_rule_dict = frappe._dict({
-        "item_code": item_code,
-        "qty": qty,
-        "stock_qty": qty,
-        "transaction_type": "selling",
-        "price_list": price_list,
-        "customer_group": customer_group,
-        "company": company,
-        "conversion_rate": 1,
-        "for_shopping_cart": True,
-        "currency": price_obj["currency"],
-        "doctype": "Quotation",
-    })
-
-    if party and party.doctype == "Customer":
-        pricing_rule_dict.update({"customer": party.name})
-
-    pricing_rule = get_pricing_rule_for_item(pricing_rule_dict)
+    pricing_rule = None
+    if apply_pricing_rule:
+        pricing_rule_dict = frappe._dict({
+            "item_code": item_code,
+            "qty": qty,
+            "stock_qty": qty,
+            "transaction_type": "selling",
+            "price_list": price_list,
+            "customer_group": customer_group,
+            "company": company,
+            "conversion_rate": 1,
+            "for_shopping_cart": True,
+            "currency": price_obj["currency"],
+            "doctype": "Quotation",
+        })
+
+        if party and party.doctype == "Customer":
+            pricing_rule_dict.update({"customer": party.name})
+
+        pricing_rule = get_pricing_rule_for_item(pricing_rule_dict)
 
     price_after_pricing_rule = base_price  # Default to base price
     discount_percent = 0
@@ -421,20 +468,11 @@ def get_price(item_code, price_list, customer_group, company, qty=1):
     final_price_with_tax = price_after_pricing_rule + tax_amount_after_rule
 
     # Step 4: Convert Price Based on UOM
-    uom_conversion_factor = frappe.db.sql(
-        """SELECT C.conversion_factor, I.sales_uom
-        FROM `tabUOM Conversion Detail` C
-        INNER JOIN `tabItem` I ON C.parent = I.name AND C.uom = I.sales_uom
-        WHERE I.name = %s""",
-        item_code,
-    )
-
     conversion_factor = 1
     sales_uom = price_obj.uom
 
-    if uom_conversion_factor and len(uom_conversion_factor) > 0:
-        conversion_factor = uom_conversion_factor[0][0]
-        sales_uom = uom_conversion_factor[0][1]
+    if uom_conversion:
+        conversion_factor, sales_uom = uom_conversion
 
     initial_price_sales_uom_excl_tax = base_price * conversion_factor
     initial_price_sales_uom_incl_tax = base_price_with_tax * conversion_factor
@@ -506,6 +544,7 @@ def website_item_on_update(doc, method):
         import_website_items_in_solr(filters=filters)
     elif doc.published == False and method == "on_update":
         # If the status changes to "Unpublished" from "Published", remove it from Solr
+        # Also drops the product, suggest and catalogue caches and purges the CDN pages of the item
         delete_document_to_solr(id=doc.item_code)  # Assuming the id is the name of the doc
 
 def website_item_before_delete(doc, method):
@@ -0,0 +1,87 @@
+import frappe
+
+from omnicommerce.utils.cache import VersionedCache
+from omnicommerce.controllers.catalogue_cache import invalidate_catalogue_cache
+
+ITEM_GROUP_TREE_TTL = 86400
+DEFAULT_ROOT_ITEM_GROUP = 'All Item Groups'
+# Category path of the Solr documents, top level first
+GROUP_FIELD_PREFIX = 'group_'
+GROUP_FIELDS = tuple(f'{GROUP_FIELD_PREFIX}{level}' for level in range(1, 6))
+
+item_group_tree_cache = VersionedCache("omnicommerce:item_group_tree", maxsize=4, ttl=ITEM_GROUP_TREE_TTL)
+
+
+def get_b2c_root_item_group():
+    """Item Group the B2C catalogue starts from, it is not part of the published paths"""
+    return frappe.get_cached_doc('Mymb Settings').get('default_item_group') or DEFAULT_ROOT_ITEM_GROUP
+
+
+def slugify_item_group(item_group):
+    # Same convention as the category URLs built by solr_search.products()
+    return item_group.replace(' ', '-').lower()
+
+
+def build_item_group_tree():
+    """
+    Resolve the ancestor path of every Item Group with a single nested-set query.
+
+    Walking the groups in lft order, the ancestors of a group are exactly the groups
+    still open on the stack, i.e. whose rgt is greater than its lft.
+    """
+    item_groups = frappe.db.sql(
+        """SELECT name, lft, rgt FROM `tabItem Group` ORDER BY lft""",
+        as_dict=True,
+    )
+
+    paths = {}
+    labels_by_slug = {}
+    stack = []
+    for item_group in item_groups:
+        while stack and stack[-1].rgt < item_group.lft:
+            stack.pop()
+        stack.append(item_group)
+        paths[item_group.name] = [group.name for group in stack]
+        labels_by_slug.setdefault(slugify_item_group(item_group.name), item_group.name)
+
+    return {
+        'paths': paths,
+        'labels_by_slug': labels_by_slug,
+    }
+
+
+def get_item_group_tree():
+    return item_group_tree_cache.get("tree", build_item_group_tree)
+
+
+def get_item_group_path(item_group, root=None):
+    """
+    Return the ancestors of item_group from the top down, item_group included.
+
+    Groups above root, root included, are left out. When root is not an ancestor
+    the whole path from the top of the tree is returned.
+    """
+    if not item_group:
+        return []
+
+    root = root or get_b2c_root_item_group()
+    path = get_item_group_tree()['paths'].get(item_group)
+    if path is None:
+        return [item_group]
+
+    if root in path:
+        path = path[path.index(root) + 1:]
+
+    return list(path)
+
+
+def get_item_group_label(slug):
+    """Return the Item Group whose category URL segment is slug"""
+    return get_item_group_tree()['labels_by_slug'].get(slug)
+
+
+def item_group_on_change(doc, method=None, *args):
+    """Hook on Item Group, rebuild the ancestor paths on the next lookup"""
+    item_group_tree_cache.invalidate()
+    # Cached catalogue pages and their ETags embed the category labels
+    invalidate_catalogue_cache()
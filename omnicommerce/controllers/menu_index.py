@@ -0,0 +1,71 @@
+from urllib.parse import urlparse, parse_qs
+
+import frappe
+from mymb_ecommerce.utils.media import get_website_domain
+
+from omnicommerce.utils.cache import VersionedCache
+from omnicommerce.controllers.catalogue_cache import invalidate_catalogue_cache
+
+MENU_INDEX_TTL = 86400
+
+menu_index_cache = VersionedCache("omnicommerce:b2c_menu", maxsize=1, ttl=MENU_INDEX_TTL)
+
+
+def build_menu_index():
+    """Index every B2C Menu by label, with its catalogue arguments and absolute image URLs"""
+    web_site_domain = get_website_domain()
+    # No order_by: the default ordering of the DocType, as frappe.get_doc / db.get_value by label used,
+    # so with repeated labels the same menu wins
+    menus = frappe.get_all(
+        "B2C Menu",
+        fields=["name", "label", "url", "title", "description", "category_menu_image", "category_banner_image"],
+    )
+
+    index = {}
+    for menu in menus:
+        if menu.label in index:
+            continue
+
+        # Split the URL at the question mark and convert the query parameters into a dictionary
+        query_params = urlparse(menu.url).query if menu.url else ""
+        query_args = {k: v[0] for k, v in parse_qs(query_params).items()}
+
+        index[menu.label] = {
+            'query_args': query_args,
+            'detail': {
+                'name': menu.name,
+                'label': menu.label,
+                'url': menu.url,
+                'title': menu.title,
+                'description': menu.description,
+                'category_menu_image': f'{web_site_domain}{menu.category_menu_image}' if menu.category_menu_image else None,
+                'category_banner_image': f'{web_site_domain}{menu.category_banner_image}' if menu.category_banner_image else None
+            },
+        }
+
+    return index
+
+
+def get_menu_index():
+    return menu_index_cache.get("index", build_menu_index)
+
+
+def get_menu_detail(label):
+    """Return the B2C Menu details shown on a category page, None when the label is unknown"""
+    entry = get_menu_index().get(label)
+    return dict(entry['detail']) if entry else None
+
+
+def get_menu_query_args(label):
+    """Return the catalogue arguments encoded in the URL of a B2C Menu, None when it has no URL"""
+    entry = get_menu_index().get(label)
+    if not entry or not entry['detail']['url']:
+        return None
+    return dict(entry['query_args'])
+
+
+def b2c_menu_on_change(doc, method=None, *args):
+    """Hook on B2C Menu, rebuild the index on the next lookup"""
+    menu_index_cache.invalidate()
+    # Cached catalogue pages embed the menu details and the home redirect
+    invalidate_catalogue_cache()
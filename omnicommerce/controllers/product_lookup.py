@@ -0,0 +1,137 @@
+import pickle
+
+import frappe
+
+from omnicommerce.controllers.solr_query import SolrQueryBuilder
+from omnicommerce.utils.solr_client import get_solr_client
+from omnicommerce.controllers.sku_lookup import fetch_solr_documents_by_skus
+
+# slug -> sku and sku -> slug, filled when items are indexed
+SLUG_INDEX_KEY = "omnicommerce:product_slugs"
+SKU_SLUG_INDEX_KEY = "omnicommerce:product_sku_slugs"
+PRODUCT_DOCUMENT_PREFIX = "omnicommerce:product_document"
+DEFAULT_PRODUCT_CACHE_TTL = 60
+
+
+def get_product_cache_ttl():
+    """Seconds a product document is kept for the product page, 0 disables the cache"""
+    return int(frappe.conf.get("omnicommerce_product_cache_ttl", DEFAULT_PRODUCT_CACHE_TTL) or 0)
+
+
+def register_product_slug(slug, sku):
+    """Remember which SKU a slug points to, dropping the previous slug of the SKU"""
+    register_product_slugs([{'slug': slug, 'sku': sku}])
+
+
+def register_product_slugs(documents):
+    """
+    Remember the slugs of a batch of indexed documents.
+
+    Same as register_product_slug() for each document, in two Redis round trips:
+    one read of the previous slugs of the SKUs and one pipeline for every write.
+    """
+    slugs = {document['sku']: document['slug'] for document in documents if document.get('sku') and document.get('slug')}
+    if not slugs:
+        return
+
+    cache = frappe.cache()
+    # Raw commands, with the key prefix and pickled values frappe's hget/hset use
+    slug_index_key = cache.make_key(SLUG_INDEX_KEY)
+    sku_slug_index_key = cache.make_key(SKU_SLUG_INDEX_KEY)
+    skus = list(slugs)
+    previous_slugs = [pickle.loads(value) if value else None for value in cache.hmget(sku_slug_index_key, skus)]
+    stale_slugs = [previous for sku, previous in zip(skus, previous_slugs) if previous and previous != slugs[sku]]
+
+    pipeline = cache.pipeline(transaction=False)
+    if stale_slugs:
+        pipeline.hdel(slug_index_key, *stale_slugs)
+    pipeline.hset(slug_index_key, mapping={slug: pickle.dumps(sku) for sku, slug in slugs.items()})
+    pipeline.hset(sku_slug_index_key, mapping={sku: pickle.dumps(slug) for sku, slug in slugs.items()})
+    pipeline.execute()
+
+    # frappe's hget keeps the values it read in the request-local cache
+    for key in (slug_index_key, sku_slug_index_key):
+        getattr(frappe.local, 'cache', {}).pop(key, None)
+
+
+def forget_product_document(sku):
+    """Drop the cached document of a SKU, its next product page view reads it from Solr"""
+    if sku:
+        frappe.cache().delete_value(f"{PRODUCT_DOCUMENT_PREFIX}:{sku}")
+
+
+def forget_product_documents(skus):
+    """Drop the cached documents of several SKUs in a single Redis call"""
+    keys = [f"{PRODUCT_DOCUMENT_PREFIX}:{sku}" for sku in skus if sku]
+    if keys:
+        frappe.cache().delete_value(keys)
+
+
+def forget_product(sku):
+    """Drop the slug and the cached document of a SKU removed from the index"""
+    if not sku:
+        return
+
+    slug = frappe.cache().hget(SKU_SLUG_INDEX_KEY, sku)
+    if slug:
+        frappe.cache().hdel(SLUG_INDEX_KEY, slug)
+    frappe.cache().hdel(SKU_SLUG_INDEX_KEY, sku)
+    forget_product_document(sku)
+
+
+def forget_all_products():
+    """Drop the whole slug index, cached documents expire on their short TTL"""
+    frappe.cache().delete_value([SLUG_INDEX_KEY, SKU_SLUG_INDEX_KEY])
+
+
+def get_product_document(sku):
+    """Solr document of a SKU, through the short-lived product cache"""
+    cache_key = f"{PRODUCT_DOCUMENT_PREFIX}:{sku}"
+    ttl = get_product_cache_ttl()
+
+    if ttl:
+        document = frappe.cache().get_value(cache_key)
+        if document:
+            return document
+
+    documents = fetch_solr_documents_by_skus([sku])
+    document = documents[0] if documents else None
+
+    if document and ttl:
+        frappe.cache().set_value(cache_key, document, expires_in_sec=ttl)
+
+    return document
+
+
+def search_product_document_by_slug(slug):
+    """Look the slug up in Solr, for slugs indexed before the slug index existed"""
+    solr = get_solr_client()
+    search_params = {
+        **SolrQueryBuilder().add_term('slug', slug).build(),
+        'rows': 1,
+    }
+    solr_results = solr.search(**search_params)
+    if not solr_results['hits']:
+        return None
+
+    return dict(solr_results['results'][0])
+
+
+def get_product_document_by_slug(slug):
+    """
+    Return the Solr document a product page slug points to, None when there is none.
+
+    Known slugs resolve to their SKU without a Solr query, the document itself
+    comes from the product cache or from a lookup by SKU.
+    """
+    sku = frappe.cache().hget(SLUG_INDEX_KEY, slug)
+    if sku:
+        document = get_product_document(sku)
+        if document and document.get('slug') == slug:
+            return document
+
+    document = search_product_document_by_slug(slug)
+    if document:
+        register_product_slug(document.get('slug'), document.get('sku'))
+
+    return document
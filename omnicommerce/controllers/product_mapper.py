@@ -0,0 +1,177 @@
+from functools import lru_cache
+
+import frappe
+from mymb_ecommerce.utils.Media import Media
+
+# Mapping between the Solr document fields and the storefront product fields.
+# Order matters: a later entry overwrites an earlier one writing the same product field.
+PRODUCT_FIELD_MAPPING = (
+    ('id', 'id'),
+    ('sku', 'sku'),
+    ('name', 'name'),
+    ('short_description', 'short_description'),
+    ('description', 'description'),
+    ('name_web', 'short_description'),
+    ('is_promo', 'is_sale'),
+    ('availability', 'stock'),
+    ('images', 'images'),
+    ('slug', 'slug'),
+    ('group_1', 'group_1'),
+    ('group_2', 'group_2'),
+    ('group_3', 'group_3'),
+    ('group_4', 'group_4'),
+    ('group_5', 'group_5'),
+    ('family_code', 'family_code'),
+    ('family_name', 'family_name'),
+
+    ('uom', 'uom'),
+    ('sales_uom_conversion_factor', 'sales_uom_conversion_factor'),
+    ('sales_uom', 'sales_uom'),
+    ('gross_price', 'gross_price'),
+    ('gross_price_with_vat', 'gross_price_with_vat'),
+    ('gross_price_uom', 'gross_price_uom'),
+    ('gross_price_uom_with_vat', 'gross_price_uom_with_vat'),
+    ('net_price', 'net_price'),
+    ('net_price_with_vat', 'net_price_with_vat'),
+    ('net_price_uom', 'net_price_uom'),
+    ('net_price_uom_with_vat', 'net_price_uom_with_vat'),
+    ('promo_price', 'promo_price'),
+    ('promo_price_with_vat', 'promo_price_with_vat'),
+    ('discount_type', 'discount_type'),
+    ('discount_value', 'discount_value'),
+    ('discount_percent', 'discount_percent'),
+)
+
+_MISSING = object()
+
+
+def get_default_product_values():
+    return {
+        'sale_count': 0,
+        'ratings': 0,
+        'reviews': "0",
+        'is_hot': True,
+        'is_new': True,
+        'is_out_of_stock': None,
+        'release_date': None,
+        'developer': None,
+        'publisher': None,
+        'game_mode': None,
+        'rated': None,
+        'until': None,
+        'variants': []
+    }
+
+
+class ProductMapper:
+    """Turn Solr documents into storefront products.
+
+    The field spec is resolved once when the mapper is built, mapping a document
+    is then a single pass over the fields that can actually be filled.
+    """
+
+    def __init__(self, fields=None):
+        self.field_pairs = tuple(
+            (solr_field, response_field)
+            for solr_field, response_field in PRODUCT_FIELD_MAPPING
+            if solr_field != 'images' and (fields is None or solr_field in fields)
+        )
+        self.map_images = fields is None or 'images' in fields
+        self.defaults = get_default_product_values()
+
+    def map(self, search_results, media):
+        field_pairs = self.field_pairs
+        defaults = self.defaults
+        map_images = self.map_images
+
+        mapped_results = []
+        append = mapped_results.append
+        for result in search_results:
+            mapped_result = dict(defaults)
+            mapped_result['variants'] = []
+
+            for solr_field, response_field in field_pairs:
+                value = result.get(solr_field, _MISSING)
+                if value is not _MISSING:
+                    mapped_result[response_field] = value
+
+            if map_images and 'images' in result:
+                # Map the image URLs
+                mapped_result.update(media.get_image_suffix(result))
+
+            if mapped_result.get('is_sale') and (mapped_result.get('promo_price') or 0) > 0:
+                # Show the initial price crossed out next to the promo price
+                mapped_result['price'] = result.get('gross_price_with_vat')
+                mapped_result['sale_price'] = result.get('promo_price_with_vat')
+            else:
+                mapped_result['sale_price'] = None
+                mapped_result['price'] = result.get('net_price_with_vat')
+
+            if 'id_group' in result:
+                mapped_result['product_categories'] = map_product_categories(result['id_group'])
+            if 'product_brands' in result:
+                mapped_result['marche'] = map_named_slugs(result['product_brands'])
+            if 'product_tags' in result:
+                mapped_result['tags'] = map_named_slugs(result['product_tags'])
+            if 'variants' in result:
+                mapped_result['varianti'] = map_variants(result['variants'])
+
+            append(mapped_result)
+
+        return mapped_results
+
+
+def map_product_categories(categories):
+    return [
+        {
+            'nome': category,
+            'slug': category,
+            'parent': category['parent_name'] if 'parent_name' in category else None
+        }
+        for category in categories
+    ]
+
+
+def map_named_slugs(entries):
+    return [{'nome': entry['name'], 'slug': entry['slug']} for entry in entries]
+
+
+def map_variants(variants):
+    mapped_variants = []
+    for variant in variants:
+        mapped_variant = {
+            'id': variant['id'],
+            'prezzo': variant['price'],
+            'prezzo_scontato': variant['sale_price'] if 'sale_price' in variant else None
+        }
+        if 'size' in variant:
+            mapped_variant['taglia'] = [{'nome': size['size_name'], 'valore': size['size']} for size in variant['size']]
+        if 'colors' in variant:
+            mapped_variant['colori'] = [{'nome': color['color_name'], 'valore': color['color']} for color in variant['colors']]
+        mapped_variants.append(mapped_variant)
+    return mapped_variants
+
+
+@lru_cache(maxsize=32)
+def get_product_mapper(fields=None):
+    """Mapper compiled once per worker for each field selection
+
+    :param fields: tuple - Solr fields to map, None for all of them
+    """
+    return ProductMapper(fields)
+
+
+@lru_cache(maxsize=4)
+def _get_media(image_uri):
+    return Media(image_uri)
+
+
+def get_media():
+    """Media helper shared by the worker, rebuilt only when the image URI setting changes"""
+    image_uri = frappe.get_cached_doc('Mymb Settings').get('image_uri')
+    return _get_media(image_uri)
+
+
+def map_products(search_results, fields=None):
+    mapper = get_product_mapper(tuple(fields) if fields else None)
+    return mapper.map(search_results, get_media())
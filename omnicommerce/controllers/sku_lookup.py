@@ -0,0 +1,54 @@
+from omnicommerce.controllers.solr_query import SolrQueryBuilder
+from omnicommerce.utils.solr_client import get_solr_client
+from omnicommerce.controllers.product_mapper import map_products
+
+# SKUs sent to Solr in a single request
+DEFAULT_SKU_CHUNK_SIZE = 250
+
+
+def unique_skus(skus):
+    """Drop empty and repeated SKUs, keeping the first occurrence order"""
+    return list(dict.fromkeys(sku for sku in skus if sku))
+
+
+def fetch_solr_documents_by_skus(skus, fields=None, chunk_size=DEFAULT_SKU_CHUNK_SIZE):
+    """
+    Fetch the Solr documents of a set of SKUs, in the order they were given.
+
+    Each chunk is one {!terms} filter query, so large sets neither hit maxBooleanClauses
+    nor get parsed and scored as a long disjunction. SKUs not in the index are skipped.
+
+    :param skus: list - item codes
+    :param fields: list - Solr fields to return, None for all of them
+    :param chunk_size: int - SKUs sent per Solr request
+    """
+    skus = unique_skus(skus)
+    if not skus:
+        return []
+
+    solr = get_solr_client()
+
+    documents = {}
+    for offset in range(0, len(skus), chunk_size):
+        chunk = skus[offset:offset + chunk_size]
+        search_params = {
+            **SolrQueryBuilder().add_terms('sku', chunk).build(),
+            'rows': len(chunk),
+            'facet': 'false',
+        }
+        if fields:
+            search_params['fl'] = ','.join(fields)
+
+        solr_results = solr.search(**search_params)
+        for result in solr_results['results']:
+            document = dict(result)
+            documents[document.get('sku')] = document
+
+    return [documents[sku] for sku in skus if sku in documents]
+
+
+def get_products_by_skus(skus, fields=None, chunk_size=DEFAULT_SKU_CHUNK_SIZE):
+    """Mapped products of a set of SKUs, in the order they were given"""
+    documents = fetch_solr_documents_by_skus(skus, fields=fields, chunk_size=chunk_size)
+    return map_products(documents, fields=fields)
+
@@ -1,20 +1,14 @@
-from mymb_ecommerce.mymb_b2c.settings.configurations import Configurations
-from mymb_ecommerce.utils.Database import Database
 import frappe
-from frappe import _
-from sqlalchemy import text
-import json
-from mymb_ecommerce.utils.Solr import Solr
+from omnicommerce.controllers.catalogue_cache import invalidate_catalogue_cache
+from omnicommerce.controllers.product_lookup import forget_product, forget_product_documents, forget_all_products
+from omnicommerce.controllers.product_lookup import register_product_slugs
+from omnicommerce.controllers.suggest import index_products_suggestions, remove_product_suggestions, clear_suggestions
+from omnicommerce.controllers.cdn import purge_document_pages, purge_all_pages, purge_surrogate_keys, get_document_surrogate_keys
+from omnicommerce.utils.solr_client import get_solr_client
 
-config = Configurations()
-solr_instance = config.get_solr_instance()
-image_uri_instance = config.get_image_uri_instance()
+# Documents sent per update request by index_documents_in_solr
+DEFAULT_INDEX_BATCH_SIZE = 500
 
-# Add the following imports at the beginning of your filestatu
-
-
-import json
-import frappe
 
 @frappe.whitelist(allow_guest=True, methods=['POST'])
 def add_document_to_solr(args=None):
@@ -25,16 +19,76 @@ def add_document_to_solr(args=None):
     """
 
 
-    # Get the Solr instance from the Configurations class
-    solr = solr_instance
+    # Shared keep-alive Solr client of this worker
+    solr = get_solr_client()
 
     # Add the document to Solr
     response = solr.add_documents([args])
     solr.commit()
+    after_documents_indexed([args])
 
     # Return the response
     return response
 
+
+def get_index_batch_size():
+    return int(frappe.conf.get("omnicommerce_index_batch_size") or DEFAULT_INDEX_BATCH_SIZE)
+
+
+def add_documents_safely(solr, documents):
+    """Send documents in one update request, a raised error becomes a failure result"""
+    try:
+        return solr.add_documents(documents)
+    except Exception as e:
+        return {'status': 'failure', 'reason': str(e)}
+
+
+def index_documents_in_solr(documents, batch_size=None, upkeep=True):
+    """
+    Add documents to the Solr index in batches, with a single commit at the end.
+
+    A batch Solr rejects is sent again one document at a time, so the result of each
+    document is still known.
+
+    :param documents: list - Solr documents
+    :param batch_size: int - documents per update request, default omnicommerce_index_batch_size
+    :param upkeep: bool - drop the caches and purge the pages of the indexed documents, off for scratch indexes
+    :return: list - (document, result) pairs, result as returned by the Solr wrapper
+    """
+    solr = get_solr_client()
+    batch_size = int(batch_size or get_index_batch_size())
+
+    results = []
+    for offset in range(0, len(documents), batch_size):
+        batch = documents[offset:offset + batch_size]
+        response = add_documents_safely(solr, batch)
+        if response.get('status') == 'success':
+            results.extend((document, response) for document in batch)
+        else:
+            results.extend((document, add_documents_safely(solr, [document])) for document in batch)
+
+    indexed = [document for document, result in results if result.get('status') == 'success']
+    if indexed:
+        solr.commit()
+        if upkeep:
+            after_documents_indexed(indexed)
+
+    return results
+
+
+def after_documents_indexed(documents):
+    """Drop the caches showing the documents just committed and purge their pages"""
+    invalidate_catalogue_cache()
+
+    # A few Redis round trips for the whole batch, not a few per document
+    forget_product_documents([document.get('sku') for document in documents])
+    # Product pages resolve the slug to the SKU without querying Solr
+    register_product_slugs(documents)
+    index_products_suggestions(documents)
+
+    # The purge backend gets the keys of the batch in chunks of MAX_SURROGATE_KEYS
+    purge_surrogate_keys([key for document in documents for key in get_document_surrogate_keys(document)])
+
 @frappe.whitelist(allow_guest=True, methods=['POST'])
 def delete_document_to_solr(id=None):
     """
@@ -45,12 +99,17 @@ def delete_document_to_solr(id=None):
     if not id:
         return {"error": "No id provided"}
 
-    # Get the Solr instance from the Configurations class
-    solr = solr_instance
+    # Shared keep-alive Solr client of this worker
+    solr = get_solr_client()
 
     # Delete the document from Solr
     response = solr.delete_document(id=id)
     solr.commit()
+    invalidate_catalogue_cache()
+    forget_product(id)
+    remove_product_suggestions(id)
+    # Listings showing the product carry its SKU key
+    purge_document_pages({'sku': id})
 
     # Return the response
     return response
@@ -64,12 +123,17 @@ def update_document_in_solr(args=None):
     """
 
 
-    # Get the Solr instance from the Configurations class
-    solr = solr_instance
+    # Shared keep-alive Solr client of this worker
+    solr = get_solr_client()
 
     # Update the document in Solr
     response = solr.update_document(args)
     solr.commit()
+    invalidate_catalogue_cache()
+    forget_product_documents([args.get('sku')])
+    # Partial updates without a name leave the completions as they are
+    index_products_suggestions([args])
+    purge_document_pages(args)
 
     # Return the response
     return response
@@ -82,12 +146,16 @@ def delete_all_solr_docs():
     :return: dict - A dictionary representing the Solr response.
     """
 
-    # Get the Solr instance from the Configurations class
-    solr = solr_instance
+    # Shared keep-alive Solr client of this worker
+    solr = get_solr_client()
 
     # Delete all documents from Solr
     response = solr.delete_all_documents()
     solr.commit()
+    invalidate_catalogue_cache()
+    forget_all_products()
+    clear_suggestions()
+    purge_all_pages()
 
     # Return the response
     return response
@@ -0,0 +1,126 @@
+import re
+
+# Characters with a meaning in the Solr standard query parser
+SOLR_SPECIAL_CHARS = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/\s])')
+
+# Separators tried in turn when joining the values of a {!terms} filter
+TERMS_SEPARATORS = (',', '|', ';')
+
+# Range filters of catalogue(): request argument -> (Solr field, bound)
+CATALOGUE_RANGE_FILTERS = {
+    'min_price': ('net_price_with_vat', 'min'),
+    'max_price': ('net_price_with_vat', 'max'),
+    'min_discount_value': ('discount_value', 'min'),
+    'max_discount_value': ('discount_value', 'max'),
+    'min_discount_percent': ('discount_percent', 'min'),
+    'max_discount_percent': ('discount_percent', 'max'),
+}
+
+
+def escape_solr_value(value):
+    """Escape a single term so it is matched literally by Solr"""
+    return SOLR_SPECIAL_CHARS.sub(r'\\\1', str(value))
+
+
+def format_range_bound(value):
+    """Return a numeric range bound, or '*' when the value is missing or not a positive number"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return '*'
+    if number <= 0:
+        return '*'
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+class SolrQueryBuilder:
+    """Collect the main query and the filter queries of a Solr search.
+
+    The free text search is the only part that goes into `q` and gets scored,
+    every constraint becomes its own `fq` clause so Solr can reuse it from the filterCache.
+    """
+
+    def __init__(self, text='*'):
+        self.text = text or '*'
+        self.filters = []
+
+    @property
+    def query(self):
+        return f'text:{self.text}'
+
+    def add_filter(self, clause):
+        if clause and clause not in self.filters:
+            self.filters.append(clause)
+        return self
+
+    def add_term(self, field, value):
+        if value is None or value == '':
+            return self
+        return self.add_filter(f'{field}:{escape_solr_value(value)}')
+
+    def add_any_of(self, field, values):
+        values = [escape_solr_value(value) for value in values if value]
+        if not values:
+            return self
+        return self.add_filter(f'{field}:({" OR ".join(values)})')
+
+    def add_terms(self, field, values):
+        """Match any of values with the terms query parser, free of the boolean clause limit"""
+        values = [str(value) for value in values if value]
+        if not values:
+            return self
+
+        # The terms parser does not unescape, pick a separator none of the values contains
+        for separator in TERMS_SEPARATORS:
+            if not any(separator in value for value in values):
+                break
+        else:
+            return self.add_any_of(field, values)
+
+        local_params = f'f={field}' if separator == ',' else f'f={field} separator="{separator}"'
+        return self.add_filter(f'{{!terms {local_params}}}{separator.join(values)}')
+
+    def add_range(self, field, min_value=None, max_value=None):
+        lower = format_range_bound(min_value)
+        upper = format_range_bound(max_value)
+        if lower == '*' and upper == '*':
+            return self
+        return self.add_filter(f'{field}:[{lower} TO {upper}]')
+
+    def build(self):
+        """Return the `q`/`fq` search parameters"""
+        params = {'q': self.query}
+        if self.filters:
+            params['fq'] = list(self.filters)
+        return params
+
+    def __repr__(self):
+        return f'<SolrQueryBuilder q={self.query!r} fq={self.filters!r}>'
+
+
+def build_catalogue_query(unified_args, skus=None):
+    """Translate the catalogue() arguments into a SolrQueryBuilder
+
+    :param unified_args: dict - the merged request and call arguments of catalogue()
+    :param skus: list - restrict the search to these item codes
+    """
+    text = unified_args.get('search_term', '*')
+    builder = SolrQueryBuilder(text)
+
+    if skus:
+        builder.add_terms('sku', skus)
+
+    ranges = {}
+    for arg, (field, bound) in CATALOGUE_RANGE_FILTERS.items():
+        value = unified_args.get(arg)
+        if value:
+            ranges.setdefault(field, {})[bound] = value
+    for field, bounds in ranges.items():
+        builder.add_range(field, bounds.get('min'), bounds.get('max'))
+
+    builder.add_term('promo_code', unified_args.get('promo_code'))
+
+    if unified_args.get('is_in_stock'):
+        builder.add_filter('availability:[1 TO *]')
+
+    return builder
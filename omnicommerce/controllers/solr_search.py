@@ -1,34 +1,52 @@
 
-from urllib.parse import quote
-from mymb_ecommerce.utils.Media import Media
-from mymb_ecommerce.mymb_b2c.settings.configurations import Configurations
-from mymb_ecommerce.mymb_ecommerce.item_feature import get_features_by_item_name, map_feature_with_uom_via_family_code
+import time
+from functools import partial
+from mymb_ecommerce.mymb_ecommerce.item_feature import get_features_by_item_name
 from mymb_ecommerce.mymb_ecommerce.item_review import get_item_reviews
 from mymb_ecommerce.mymb_ecommerce.wishlist import get_from_wishlist
-from mymb_ecommerce.utils.media import get_website_domain
 from omnicommerce.controllers.item_best_selling import get_top_items
+from omnicommerce.controllers.solr_query import build_catalogue_query
+from omnicommerce.controllers.catalogue_facets import JsonFacetRequest, is_json_facet_enabled, get_json_facets
+from omnicommerce.controllers.cdn import cdn_cacheable, get_catalogue_surrogate_keys, get_product_page_surrogate_keys
+from omnicommerce.controllers.catalogue_profiles import get_catalogue_profile, add_profile_field_list
+from omnicommerce.controllers.product_mapper import map_products
+from omnicommerce.controllers.feature_cache import map_feature_with_uom_cached
+from omnicommerce.controllers.menu_index import get_menu_detail, get_menu_query_args
+from omnicommerce.controllers.item_group_tree import get_item_group_label
+from omnicommerce.controllers.sku_lookup import get_products_by_skus, fetch_solr_documents_by_skus, unique_skus
+from omnicommerce.controllers.product_lookup import get_product_document_by_slug
+from omnicommerce.controllers.catalogue_cache import get_catalogue_cache_key, get_cached_catalogue, set_cached_catalogue
+from omnicommerce.controllers.catalogue_cache import get_catalogue_etag, get_index_version, get_catalogue_paging
+from omnicommerce.controllers.catalogue_cache import get_price_bounds_cache_key, get_cached_price_bounds, set_cached_price_bounds
+from omnicommerce.utils.concurrency import ConcurrentBranches, submit_background
+from omnicommerce.utils.solr_client import get_solr_client
+from omnicommerce.utils.fast_json import fast_json_response
+from omnicommerce.utils.http_cache import conditional_get, make_etag
+from omnicommerce.utils.timing import timed_endpoint, timing_stage, with_debug_timings
 
 import frappe
 from frappe import _
+from frappe.utils import cint
 
 from mymb_ecommerce.utils.JWTManager import JWTManager, JWT_SECRET_KEY
 jwt_manager = JWTManager(secret_key=JWT_SECRET_KEY)
 
+DEFAULT_PRODUCTS_BRANCH_TIMEOUT = 2
+DEFAULT_CURSOR_BATCH_SIZE = 500
+BEST_SELLING_PRODUCTS_LIMIT = 12
+DEFAULT_RANDOM_SEED_WINDOW = 3600
+DEFAULT_PRODUCT_ETAG_WINDOW = 300
 
 
 
-@frappe.whitelist(allow_guest=True, methods=['GET'])
-def shop(args=None):
-    # Call the catalogue function with the given arguments
-    return catalogue(args)
 
-@frappe.whitelist(allow_guest=True, methods=['GET'])
-def catalogue(args=None):
+def get_catalogue_args(args=None):
+    """The catalogue() arguments, given and from the query string, with the random seed resolved"""
     # If args is None, make it an empty dictionary
     args = args or {}
 
     # Check if frappe.local.request exists (to avoid errors in background jobs)
-    if hasattr(frappe.local, 'request'):
+    if getattr(frappe.local, 'request', None):
         request_args = {key: frappe.local.request.args.get(key) for key in frappe.local.request.args}
     else:
         request_args = {}  # No request context in background job
@@ -36,24 +54,106 @@ def catalogue(args=None):
     # Merge dictionaries with args taking precedence
     unified_args = {**request_args, **args}
 
-    per_page_value = unified_args.get('per_page', 12)
-    per_page = int(per_page_value) if per_page_value else 1
-    
-    page_value = unified_args.get('page', 1)
-    page = int(page_value) if page_value else 1
-    page = page - 1 if page > 0 else 0
+    # A random order is seeded per time window, so it can be cached and paged through
+    if unified_args.get('is_random'):
+        unified_args['random_seed'] = get_random_seed(unified_args)
+
+    return unified_args
+
+
+def get_catalogue_request_etag(args=None):
+    return get_catalogue_etag(get_catalogue_args(args))
+
+
+def get_catalogue_request_surrogate_keys(response, args=None):
+    unified_args = get_catalogue_args(args)
+    if unified_args.get('wishlist'):
+        return None
+    return get_catalogue_surrogate_keys(unified_args, response)
+
+
+@frappe.whitelist(allow_guest=True, methods=['GET'])
+@conditional_get(get_catalogue_request_etag)
+@fast_json_response
+@cdn_cacheable(get_catalogue_request_surrogate_keys)
+def shop(args=None):
+    # Call the catalogue function with the given arguments
+    return get_catalogue(args)
+
+@frappe.whitelist(allow_guest=True, methods=['GET'])
+@conditional_get(get_catalogue_request_etag)
+@fast_json_response
+@cdn_cacheable(get_catalogue_request_surrogate_keys)
+def catalogue(args=None):
+    return get_catalogue(args)
+
+
+def get_catalogue(args=None):
+    """
+    The catalogue() response without the HTTP behaviour of the endpoint: no ETag, encoding
+    or CDN headers. Internal callers, threads and jobs call this one.
+    """
+    unified_args = get_catalogue_args(args)
+
+    with timed_endpoint('catalogue') as timer:
+        # Serve the same canonical request from the shared cache until the index changes
+        with timing_stage('cache'):
+            cache_key = get_catalogue_cache_key(unified_args)
+            cached_response = get_cached_catalogue(cache_key)
+
+        if cached_response:
+            response = cached_response
+        else:
+            response = build_catalogue(unified_args)
+            with timing_stage('cache'):
+                set_cached_catalogue(cache_key, response)
+
+        # Shoppers usually go on to the next page: have it cached before they ask for it
+        if cache_key and is_catalogue_prefetch_enabled():
+            prefetch_next_catalogue_page(unified_args, response)
+
+    return with_debug_timings(response, timer)
+
+
+def is_catalogue_prefetch_enabled():
+    """Prefetch only for storefront requests, not for internal calls, threads or jobs"""
+    return bool(frappe.conf.get("omnicommerce_catalogue_prefetch")) and bool(getattr(frappe.local, 'request', None))
+
+
+def prefetch_next_catalogue_page(unified_args, response):
+    if response.get('is_last'):
+        return
+
+    next_args = {**unified_args, 'page': str(response['current_page'] + 1)}
+    # Checked here, a background slot and its database connection are only taken for pages to build
+    next_cache_key = get_catalogue_cache_key(next_args)
+    if not next_cache_key or frappe.cache().exists(next_cache_key):
+        return
+
+    submit_background(warm_catalogue_page, next_args)
+
+
+def warm_catalogue_page(unified_args):
+    """Build and cache a catalogue page, unless it is cached already"""
+    cache_key = get_catalogue_cache_key(unified_args)
+    if not cache_key or frappe.cache().exists(cache_key):
+        return
+
+    set_cached_catalogue(cache_key, build_catalogue(unified_args))
+
+
+def build_catalogue(unified_args):
+    page, per_page = get_catalogue_paging(unified_args)
+    page = page - 1
 
     text = unified_args.get('search_term', '*')
     groups = unified_args.get('category')
     features = unified_args.get('features')
     wishlist = unified_args.get('wishlist')
-    family_code = unified_args.get('family_code')
-    family_name = unified_args.get('family_name')
     home = unified_args.get('home' , False)
     skus = unified_args.get('skus')
-    is_in_stock = unified_args.get('is_in_stock' , False)
     category_detail = unified_args.get('category_detail')
-    promo_code = unified_args.get('promo_code')
+    profile = get_catalogue_profile(unified_args.get('profile'))
 
 
     start = page*per_page
@@ -61,22 +161,14 @@ def catalogue(args=None):
         text="*"
 
     if home:
-        label_to_search = "home"
-        url_value = frappe.db.get_value('B2C Menu', {'label': label_to_search}, 'url')
-        
-        if url_value:
-            # Split the URL at the question mark to get the query parameters
-            query_params = urlparse(url_value).query
-            # Convert the query parameters into a dictionary
-            args_dict = {k: v[0] for k, v in parse_qs(query_params).items()}
-            args_dict["home"] = False            
-             
-            return  catalogue(args_dict)
-        else:
-            query = f'text:{text}'
-
-
-        
+        # The home page shows the catalogue configured on the "home" B2C Menu
+        with timing_stage('menu'):
+            args_dict = get_menu_query_args("home")
+        if args_dict is not None:
+            # The menu filters win over the request ones, as before, but the page is always the one
+            # asked for: prefetched pages carry it in unified_args, not in a request. Built here,
+            # the page is cached and prefetched once, under the key of the home request
+            return build_catalogue({**unified_args, **args_dict, 'home': False, 'page': unified_args.get('page')})
 
     wishlist_items = []  # Initialize wishlist_items variable
 
@@ -85,113 +177,78 @@ def catalogue(args=None):
         JWTManager.verify_jwt_in_request()
         wishlist_items = get_from_wishlist(user=frappe.local.jwt_payload['email'])
 
-    if wishlist_items:
-        item_codes = [item['item_code'] for item in wishlist_items]
-        query = f'text:{text} AND ({" OR ".join([f"sku:{code}" for code in item_codes])})'
-    else:
-        query = f'text:{text} '
+    item_codes = [item['item_code'] for item in wishlist_items]
 
     #search item by code
     if skus:
-        skus_array = skus.split(";")
-        query = f'text:{text} AND ({" OR ".join([f"sku:{sku}" for sku in skus_array])})'
-
-    # Check if min_price is provided in the query string and add it to the query if it is
-    min_price = unified_args.get('min_price')
-    if min_price and float(min_price) > 0:
-        query += f' AND net_price_with_vat:[{min_price} TO *]'
-
-    # Check if max_price is provided in the query string and add it to the query if it is
-    max_price = unified_args.get('max_price')
-    if max_price and float(max_price) > 0:
-        query += f' AND net_price_with_vat:[* TO {max_price}]'
-
-    # Check if min_discount_value is provided in the query string and add it to the query if it is
-    min_discount_value = unified_args.get('min_discount_value')
-    if min_discount_value and float(min_discount_value) > 0:
-        query += f' AND discount_value:[{min_discount_value} TO *]'
-
-    # Check if max_discount_value is provided in the query string and add it to the query if it is
-    max_discount_value= unified_args.get('max_discount_value')
-    if max_discount_value and float(max_discount_value) > 0:
-        query += f' AND discount_value:[* TO {max_discount_value}]'
-
-    # Check if min_discount_percent is provided in the query string and add it to the query if it is
-    min_discount_percent = unified_args.get('min_discount_percent')
-    if min_discount_percent and float(min_discount_percent) > 0:
-        query += f' AND discount_percent:[{min_discount_percent} TO *]'
-
-    # Check if max_discount_percent is provided in the query string and add it to the query if it is
-    max_discount_percent= unified_args.get('max_discount_percent')
-    if max_discount_percent and float(max_discount_percent) > 0:
-        query += f' AND discount_percent:[* TO {max_discount_percent}]'
-    
-    if promo_code:
-        query += f' AND promo_code:{promo_code} '
-
-    if is_in_stock:
-        query += f' AND availability:[1 TO *]'
+        item_codes = skus.split(";")
 
-    order_by = unified_args.get('order_by')
+    # Only the free text goes into q, every other constraint becomes its own fq clause
+    query_builder = build_catalogue_query({**unified_args, 'search_term': text}, skus=item_codes)
+    query = query_builder.query
 
     # Construct the Solr search parameters
     search_params = {
-        'q': query,
+        **query_builder.build(),
         'start': start,
         'rows': per_page,
-        'stats': 'true',
-        'stats.field': 'net_price_with_vat'
     }
 
-    if groups:
-       search_params["groups"]=groups 
-    
-    if family_code:
-       search_params["family_code"]=family_code 
-    if family_name:
-       search_params["family_name"]=family_name 
-
-    if features:
-        search_params["features"]=features
-
-    # Sort the search results based on the value of the "order_by" parameter
-    if order_by == 'price-asc':
-        search_params['sort'] = 'net_price_with_vat asc'
-    elif order_by == 'price-desc':
-        search_params['sort'] = 'net_price_with_vat desc'
-    
-    order_by_creation_at = unified_args.get('order_by_creation_at')
-    if order_by_creation_at == 'asc':
-        search_params['sort'] = 'created_at asc'
-    elif order_by_creation_at == 'desc':
-        search_params['sort'] = 'created_at desc'
-
-    order_by_updated_at = unified_args.get('order_by_updated_at')
-    if order_by_updated_at == 'asc':
-        search_params['sort'] = 'updated_at asc'
-    elif order_by_updated_at == 'desc':
-        search_params['sort'] = 'updated_at desc'
-
-    if unified_args.get('is_random'):
-        search_params['is_random'] = unified_args.get('is_random')
-
-    # Get the Solr instance from the Configurations class
-    config = Configurations()
-    solr_instance = config.get_solr_instance()
-    solr = solr_instance
+    add_catalogue_group_params(search_params, unified_args)
+    add_profile_field_list(search_params, profile)
+
+    # The price bounds only depend on the filters: pages and sorts after the first reuse them
+    # and skip the stats component
+    price_bounds_cache_key = get_price_bounds_cache_key(search_params)
+    price_bounds = get_cached_price_bounds(price_bounds_cache_key)
+
+    # Opt-in: category and feature counts, price bounds, price histogram and discount ranges
+    # from a single JSON Facet request
+    json_facet_request = JsonFacetRequest(groups) if is_json_facet_enabled() else None
+    if json_facet_request:
+        json_facet_request.add_to(search_params)
+    elif price_bounds is None:
+        search_params['stats'] = 'true'
+        search_params['stats.field'] = 'net_price_with_vat'
+
+    # Sort the search results based on the value of the "order_by" parameters
+    sort = get_catalogue_sort(unified_args)
+    if sort:
+        search_params['sort'] = sort
+
+    # Wishlists and SKU lists are paged in the order they were given, unless another sort was asked:
+    # the search returns the SKU of every match, the page is cut from them in that order and
+    # only its documents are fetched in full
+    paged_by_skus = bool(item_codes) and not sort
+    if paged_by_skus:
+        search_params['start'] = 0
+        search_params['rows'] = len(item_codes)
+        search_params['fl'] = 'sku'
+
+    # Shared keep-alive Solr client of this worker
+    solr = get_solr_client()
 
     # Execute the search and get the results
-    solr_results = solr.search(**search_params)
+    with timing_stage('solr'):
+        solr_results = solr.search(**search_params)
 
     # Get the total number of search results
     count = solr_results.get('hits')
 
+    json_facets = json_facet_request.map(get_json_facets(solr_results)) if json_facet_request else None
+
     # Get the minimum and maximum prices of all products
-    solr_full_response = solr_results.get('response')
-    stats = solr_full_response.stats
-    price_stats = stats.get('stats_fields', {}).get('net_price_with_vat', {})
-    min_price_all = price_stats.get('min')
-    max_price_all = price_stats.get('max')
+    if price_bounds is None and json_facets:
+        price_bounds = json_facets['price_bounds']
+        set_cached_price_bounds(price_bounds_cache_key, price_bounds)
+    elif price_bounds is None:
+        solr_full_response = solr_results.get('response')
+        stats = solr_full_response.stats or {}
+        price_stats = (stats.get('stats_fields') or {}).get('net_price_with_vat') or {}
+        price_bounds = {'min': price_stats.get('min'), 'max': price_stats.get('max')}
+        set_cached_price_bounds(price_bounds_cache_key, price_bounds)
+    min_price_all = price_bounds['min']
+    max_price_all = price_bounds['max']
 
     # Calculate the number of pages
     pages = int((count + per_page - 1) / per_page)
@@ -202,17 +259,39 @@ def catalogue(args=None):
     # Extract the search results from the response
     search_results = [dict(result) for result in solr_results['results']]
 
-    # Get the image uri instance from the Configurations class
+    if paged_by_skus:
+        matching_skus = {result.get('sku') for result in search_results}
+        page_skus = [sku for sku in unique_skus(item_codes) if sku in matching_skus][start:start + per_page]
+        with timing_stage('solr'):
+            search_results = fetch_solr_documents_by_skus(page_skus, fields=profile['fields'])
 
-    search_results_mapped = map_solr_response_b2c(search_results)
+    with timing_stage('map'):
+        search_results_mapped = map_solr_response_b2c(search_results, fields=profile['fields'])
 
     # Construct the response
+    category = None
+    price_histogram = []
+    discount_ranges = []
     facet = solr_results.get('facet_counts')
-    if facet:
+    if json_facets:
+        category = json_facets['category']
+        features = json_facets['features']
+        price_histogram = json_facets['price_histogram']
+        discount_ranges = json_facets['discount_ranges']
+    elif facet:
         category = facet.get('category')
         features = facet.get('features')
+    if json_facets or facet:
         #We have map features with their uom
-        features = map_feature_with_uom_via_family_code(features , search_results_mapped)
+        with timing_stage('features'):
+            features = map_feature_with_uom_cached(features , search_results_mapped)
+
+    with timing_stage('menu'):
+        menu_category_detail = get_menu_category_detail(category_detail)
+
+    with timing_stage('category_tree'):
+        category_tree = get_category_tree(groups , search_results)
+
     response =  {
         'totalCount': count,
         'current_page': page + 1,
@@ -220,219 +299,205 @@ def catalogue(args=None):
         'per_page': per_page,
         'is_last':is_last,
         'products': search_results_mapped,
-        'solr_result' : search_results,
         'query': query,
+        'filter_queries': query_builder.filters,
         'min_price_all': int(min_price_all) if min_price_all is not None else None,
         'max_price_all': int(max_price_all) if max_price_all is not None else None,
         "category": category,
         "features": features,
-        "menu_category_detail": get_menu_category_detail(category_detail),
-        "category_tree": get_category_tree(groups , search_results)
+        "price_histogram": price_histogram,
+        "discount_ranges": discount_ranges,
+        "menu_category_detail": menu_category_detail,
+        "category_tree": category_tree
     }
+
+    # The raw documents double the payload, only the default profile still returns them
+    if profile['include_solr_result']:
+        response['solr_result'] = search_results
+
     return response
+
+
+def add_catalogue_group_params(search_params, unified_args):
+    """Forward the category, family and feature filters of catalogue() to the Solr wrapper"""
+    groups = unified_args.get('category')
+    if groups:
+        search_params["groups"] = groups
+
+    family_code = unified_args.get('family_code')
+    if family_code:
+        search_params["family_code"] = family_code
+    family_name = unified_args.get('family_name')
+    if family_name:
+        search_params["family_name"] = family_name
+
+    features = unified_args.get('features')
+    if features:
+        search_params["features"]=features
+
+    return search_params
+
+
+def get_random_seed(unified_args):
+    """Seed of the random order: the random_seed argument, or the current rotation window"""
+    seed = cint(unified_args.get('random_seed'))
+    if seed > 0:
+        return seed
+
+    window = cint(frappe.conf.get("omnicommerce_random_seed_window")) or DEFAULT_RANDOM_SEED_WINDOW
+    return int(time.time() // window)
+
+
+def get_catalogue_sort(unified_args):
+    """Return the Solr sort clause requested through the order_by arguments, None for relevance"""
+    sort = None
+
+    # Same seed, same order: stable across the pages and the cache of one rotation window.
+    # Needs the random_* dynamic field (solr.RandomSortField) in the schema
+    if unified_args.get('is_random'):
+        sort = f'random_{get_random_seed(unified_args)} asc'
+
+    order_by = unified_args.get('order_by')
+    if order_by == 'price-asc':
+        sort = 'net_price_with_vat asc'
+    elif order_by == 'price-desc':
+        sort = 'net_price_with_vat desc'
+
+    order_by_creation_at = unified_args.get('order_by_creation_at')
+    if order_by_creation_at == 'asc':
+        sort = 'created_at asc'
+    elif order_by_creation_at == 'desc':
+        sort = 'created_at desc'
+
+    order_by_updated_at = unified_args.get('order_by_updated_at')
+    if order_by_updated_at == 'asc':
+        sort = 'updated_at asc'
+    elif order_by_updated_at == 'desc':
+        sort = 'updated_at desc'
+
+    return sort
+
+
+def iter_catalogue(args=None, batch_size=DEFAULT_CURSOR_BATCH_SIZE, profile='export'):
+    """
+    Yield every product matching the catalogue() filters, walking the index with cursorMark.
+
+    Unlike paging with start offsets, every batch costs the same however deep it is,
+    and only one batch is held in memory. Stats and facets are not requested.
+
+    :param args: dict - the same filters accepted by catalogue(), page and per_page are ignored
+    :param batch_size: int - number of documents fetched per Solr request
+    :param profile: str - catalogue profile selecting the fields fetched and mapped
+    """
+    unified_args = dict(args or {})
+
+    skus = unified_args.get('skus')
+    item_codes = skus.split(";") if skus else None
+    query_builder = build_catalogue_query(unified_args, skus=item_codes)
+
+    # cursorMark needs a stable order, so the unique key always closes the sort
+    sort = get_catalogue_sort(unified_args)
+    search_params = {
+        **query_builder.build(),
+        'rows': int(batch_size),
+        'sort': f'{sort}, id asc' if sort else 'id asc',
+        'facet': 'false',
+    }
+    add_catalogue_group_params(search_params, unified_args)
+    profile = get_catalogue_profile(profile)
+    add_profile_field_list(search_params, profile)
+
+    solr = get_solr_client()
+
+    cursor_mark = '*'
+    while True:
+        solr_results = solr.search(**search_params, cursorMark=cursor_mark)
+        search_results = [dict(result) for result in solr_results['results']]
+        if not search_results:
+            break
+
+        yield from map_solr_response_b2c(search_results, fields=profile['fields'])
+
+        next_cursor_mark = solr_results['response'].nextCursorMark
+        if not next_cursor_mark or next_cursor_mark == cursor_mark:
+            break
+        cursor_mark = next_cursor_mark
+
+
 def get_category_tree(groups, search_results_mapped):
-    if search_results_mapped and len(search_results_mapped) > 0 and groups is not None and len(groups) > 0:
-        item = search_results_mapped[0]
-        groups_array = groups.split(',')
-        max_depth = len(groups_array)
-        category_tree = []
-
-        for i in range(max_depth):
-            if f'group_{i+1}' in item:
-                group_label = item[f'group_{i+1}']
-                url = ','.join(groups_array[:i+1])
-                category_tree.append({"label": group_label, "url": url})
-
-        return category_tree
-    else:
+    if groups is None or len(groups) == 0:
         return []
-    
+
+    item = search_results_mapped[0] if search_results_mapped else {}
+    groups_array = groups.split(',')
+    category_tree = []
+
+    for i, group_slug in enumerate(groups_array):
+        # Label from the first product, or from the Item Group tree when nothing was found
+        group_label = item.get(f'group_{i+1}') or get_item_group_label(group_slug)
+        if group_label:
+            url = ','.join(groups_array[:i+1])
+            category_tree.append({"label": group_label, "url": url})
+
+    return category_tree
 
 
 def get_menu_category_detail(category_detail):
+    # Served from the per-worker B2C Menu index, refreshed when a menu is saved
+    return get_menu_detail(category_detail)
 
 
-    web_site_domain = get_website_domain()
-    try:
-        # This will fetch specific fields of the document where label matches `menu_category`
-        doc_dict = frappe.get_doc("B2C Menu", {"label": category_detail})
-        # Filter the doc_dict to include only the desired keys
-        filtered_dict = {
-            'name': doc_dict.get('name'),
-            'label': doc_dict.get('label'),
-            'url': doc_dict.get('url'),
-            'title': doc_dict.get('title'),
-            'description': doc_dict.get('description'),
-            'category_menu_image': f'{web_site_domain}{doc_dict.get("category_menu_image")}' if doc_dict.get("category_menu_image") else None,
-            'category_banner_image': f'{web_site_domain}{doc_dict.get("category_banner_image")}' if doc_dict.get("category_banner_image") else None
-        }
-        
-
-        return filtered_dict
-
-    except frappe.DoesNotExistError:
-        # Handle the case where no document matches the provided `menu_category`
-        return None
+def map_solr_response_b2c(search_results, fields=None):
+    """
+    Map Solr documents to storefront products.
 
+    :param search_results: list - Solr documents as dictionaries
+    :param fields: list - Solr fields to map, None for all of them
+    :return: list - the mapped products, in the same order
+    """
+    return map_products(search_results, fields=fields)
 
-def map_solr_response_b2c(search_results ):
-    # Define the mapping between Solr and our response
-
-    config = Configurations()
-    image_uri_instance = config.get_image_uri_instance()
-    field_mapping = {
-        'id': 'id',
-        'sku': 'sku',
-        'name': 'name',
-        'short_description': 'short_description',
-        'description': 'description',
-        'name_web':'short_description',
-        'is_promo':'is_sale',
-        'availability':'stock',
-        'images': 'images',
-        'slug':'slug',
-        'group_1':'group_1',
-        'group_2':'group_2',
-        'group_3':'group_3',
-        'group_4':'group_4',
-        'group_5':'group_5',
-        'family_code':'family_code',
-        'family_name':'family_name',
-
-        'uom': 'uom',
-        'sales_uom_conversion_factor': 'sales_uom_conversion_factor',
-        'sales_uom': 'sales_uom',
-        'gross_price': 'gross_price',
-        'gross_price_with_vat': 'gross_price_with_vat',
-        'gross_price_uom': 'gross_price_uom',
-        'gross_price_uom_with_vat': 'gross_price_uom_with_vat',
-        'net_price': 'net_price',
-        'net_price_with_vat': 'net_price_with_vat',
-        'net_price_uom': 'net_price_uom',
-        'net_price_uom_with_vat': 'net_price_uom_with_vat',
-        'promo_price': 'promo_price',
-        'promo_price_with_vat': 'promo_price_with_vat',
-        'discount_type': 'discount_type',
-        'discount_value': 'discount_value',
-        'discount_percent': 'discount_percent'
-    }
 
+def get_products_branch_timeout():
+    """Seconds each product page sub-query may take before it is returned empty"""
+    return float(frappe.conf.get("omnicommerce_products_branch_timeout") or DEFAULT_PRODUCTS_BRANCH_TIMEOUT)
 
-    # Initialize the mapped results list
-    mapped_results = []
-
-    # Map the Solr results to our desired format
-    media = Media(image_uri_instance)
-    for result in search_results:
-        mapped_result = get_default_product_values()  # Add default values
-        for solr_field, response_field in field_mapping.items():
-            # Skip fields that are not present in the Solr result
-            if solr_field not in result:
-                continue
-            if solr_field == 'images':
-                # Map the image URLs
-                images = media.get_image_suffix(result )
-                mapped_result.update(images)
-            else:
-                mapped_result[response_field] = result[solr_field]
-
-        if mapped_result['is_sale']  and mapped_result['promo_price'] > 0 :
-            # Swap price and sale_price if prezzo_iniziale exists and is greater than 0
-            mapped_result['price'] = result['gross_price_with_vat']
-            mapped_result['sale_price'] = result['promo_price_with_vat']
-        else:
-            mapped_result['sale_price'] = None
-            mapped_result['price'] = result['net_price_with_vat']
-
-        # Map additional fields
-        if 'id_group' in result:
-            mapped_result['product_categories'] = []
-            for category in result['id_group']:
-                mapped_category = {
-                    'nome': category,
-                    'slug': category ,
-                    'parent': category['parent_name'] if 'parent_name' in category else None
-                }
-                mapped_result['product_categories'].append(mapped_category)
-
-        if 'product_brands' in result:
-            mapped_result['marche'] = []
-            for brand in result['product_brands']:
-                mapped_brand = {
-                    'nome': brand['name'],
-                    'slug': brand['slug']
-                }
-                mapped_result['marche'].append(mapped_brand)
-
-        if 'product_tags' in result:
-            mapped_result['tags'] = []
-            for tag in result['product_tags']:
-                mapped_tag = {
-                    'nome': tag['name'],
-                    'slug': tag['slug']
-                }
-                mapped_result['tags'].append(mapped_tag)
-
-        if 'variants' in result:
-            mapped_result['varianti'] = []
-            for variant in result['variants']:
-                mapped_variant = {
-                    'id': variant['id'],
-                    'prezzo': variant['price'],
-                    'prezzo_scontato': variant['sale_price'] if 'sale_price' in variant else None
-                }
-                if 'size' in variant:
-                    mapped_variant['taglia'] = []
-                    for size in variant['size']:
-                        mapped_size = {
-                            'nome': size['size_name'],
-                            'valore': size['size']
-                        }
-                        mapped_variant['taglia'].append(mapped_size)
-
-                if 'colors' in variant:
-                    mapped_variant['colori'] = []
-                    for color in variant['colors']:
-                        mapped_color = {
-                            'nome': color['color_name'],
-                            'valore': color['color']
-                        }
-                        mapped_variant['colori'].append(mapped_color)
-
-                mapped_result['varianti'].append(mapped_variant)
-
-        mapped_results.append(mapped_result)
-
-    return mapped_results
-
-
-def get_default_product_values():
-    return {
-        'sale_count': 0,
-        'ratings': 0,
-        'reviews': "0",
-        'is_hot': True,
-        'is_new': True,
-        'is_out_of_stock': None,
-        'release_date': None,
-        'developer': None,
-        'publisher': None,
-        'game_mode': None,
-        'rated': None,
-        'until': None,
-        'variants': []
-    }
 
+def get_best_selling_products(fallback_args=None):
+    #Best selling item in the last 30 days, in best selling order
+    get_top_items_code = get_top_items(30, 30) 
+    skus_list = [item['item_code'] for item in get_top_items_code]
+    if not skus_list:
+        # No sales yet: keep showing the first products of the catalogue
+        return get_catalogue(frappe._dict(fallback_args or {}))
+
+    products = get_products_by_skus(skus_list)
+    return {'products': products[:BEST_SELLING_PRODUCTS_LIMIT]}
+
+
+def get_product_page_etag():
+    """The product page also shows reviews and best sellers, which do not change the index version:
+    its ETag changes at least every omnicommerce_product_etag_window seconds"""
+    request = getattr(frappe.local, 'request', None)
+    slug = request.args.get('slug') if request else None
+    if not slug:
+        return None
+    window = cint(frappe.conf.get("omnicommerce_product_etag_window")) or DEFAULT_PRODUCT_ETAG_WINDOW
+    return make_etag('products', get_index_version(), slug, int(time.time() // window))
 
 
 @frappe.whitelist(allow_guest=True)
+@conditional_get(get_product_page_etag)
+@fast_json_response
+@cdn_cacheable(get_product_page_surrogate_keys)
 def products():
+    with timed_endpoint('products') as timer:
+        response = build_product_page()
+
+    return with_debug_timings(response, timer)
 
-    config = Configurations()
-    solr_instance = config.get_solr_instance()
 
-    # Get the Solr instance from the Mymb b2c Settings DocType
-    solr = solr_instance
+def build_product_page():
 
     # Get the slug parameter from the query string
     slug = frappe.local.request.args.get('slug')
@@ -441,64 +506,65 @@ def products():
     if not slug:
         frappe.throw(_('Slug parameter is missing'), frappe.ValidationError)
 
-    # Construct the Solr query to search for the product based on its slug
-    query = f'slug:{slug}'
-
-    # Construct the Solr search parameters
-    search_params = {
-        'q': query,
-        'rows': 1,
-    }
-
-    # Execute the search and get the results
-    solr_results = solr.search(**search_params)
-
-    single_result = solr_results['results'][0]
-
+    # Resolve the slug through the slug index and the product cache, Solr is only searched for unknown slugs
+    with timing_stage('lookup'):
+        single_result = get_product_document_by_slug(slug)
 
     # Check if there are any search results
-    if solr_results['hits'] == 0:
+    if not single_result:
         frappe.throw(_('Product not found'), frappe.DoesNotExistError)
 
     # Extract the product details from the Solr result
-    product = map_solr_response_b2c([dict(single_result)])[0]
+    with timing_stage('map'):
+        product = map_solr_response_b2c([dict(single_result)])[0]
+
+    sku = product["sku"]
 
     #Family name is unique for the group
     args = frappe._dict()
     if 'family_name' in product:
         args.family_name = product.get('family_name')
 
-    relatedProducts = catalogue(args)
-
-    #Best selling item in the last 30 days
-    args_best_selling_products = frappe._dict()
-    get_top_items_code = get_top_items(30, 30) 
-    skus_list = [item['item_code'] for item in get_top_items_code]
-    skus_string = ';'.join(skus_list)
-    args_best_selling_products.skus = skus_string
-    bestSellingProducts= catalogue(args_best_selling_products)
-
-    #Item in discount
+    #Item in discount, in the random order of the current window so the block is served from the cache
     args_featured_products = frappe._dict()
     args_featured_products.min_discount_value = 1
     args_featured_products.is_random = True
-    featuredProducts = catalogue(args_featured_products)
 
-    product["features"] = get_features_by_item_name(product["sku"])
-    product['item_reviews'] = get_item_reviews(product["sku"])
+    # The carousels, features and reviews do not depend on each other: run them at the same time
+    # and let a slow branch come back empty instead of stalling the product page
+    branch_timeout = get_products_branch_timeout()
+    empty_catalogue = {'products': []}
+    # The branches run without the request, their catalogue arguments are resolved here
+    branches = ConcurrentBranches({
+        'related_products': (partial(get_catalogue, get_catalogue_args(args)), branch_timeout, empty_catalogue),
+        'best_selling_products': (partial(get_best_selling_products, get_catalogue_args()), branch_timeout, empty_catalogue),
+        'featured_products': (partial(get_catalogue, get_catalogue_args(args_featured_products)), branch_timeout, empty_catalogue),
+        'features': (partial(get_features_by_item_name, sku), branch_timeout, []),
+        'item_reviews': (partial(get_item_reviews, sku), branch_timeout, []),
+    })
 
     # Fetch from the doctype Website Item where item_code=sku
-    website_item = frappe.get_value("Website Item", {"item_code": product["sku"]},
-                                   ["web_long_description", "short_description", "name" , "website_content"], as_dict=True)
+    with timing_stage('website_item'):
+        website_item = frappe.get_value("Website Item", {"item_code": sku},
+                                       ["web_long_description", "short_description", "name" , "website_content"], as_dict=True)
 
     if not website_item:
-        frappe.throw(_('Website Item not found for SKU {0}').format(product["sku"]), frappe.DoesNotExistError)
+        frappe.throw(_('Website Item not found for SKU {0}').format(sku), frappe.DoesNotExistError)
+
+    # Time spent waiting for the branches still running after the main thread is done
+    with timing_stage('branches'):
+        branch_results = branches.collect()
+    relatedProducts = branch_results['related_products']
+    bestSellingProducts = branch_results['best_selling_products']
+    featuredProducts = branch_results['featured_products']
+
+    product["features"] = branch_results['features']
 
     # Update product dictionary with details from Website Item
     product['long_description'] = website_item.get('web_long_description', '')
     product['short_description'] = website_item.get('short_description', '')
     product['website_content'] = website_item.get('website_content', '')
-    product['item_reviews'] = get_item_reviews(product["sku"])
+    product['item_reviews'] = branch_results['item_reviews']
 
     # set categories
     field = "category"
@@ -0,0 +1,237 @@
+import pickle
+import unicodedata
+
+import frappe
+from frappe.utils import cint
+
+from omnicommerce.controllers.item_group_tree import GROUP_FIELDS, slugify_item_group
+
+# Sorted set of "<normalized text>\x1f<kind>\x1f<key>\x1f<label>\x1f<slug>" members, all with score 0
+# so Redis keeps them in lexicographic order and a prefix is a single ZRANGEBYLEX range
+SUGGEST_INDEX_KEY = "omnicommerce:suggest:index"
+# sku -> members added for that product, so it can be removed incrementally
+SUGGEST_SKU_MEMBERS_KEY = "omnicommerce:suggest:sku_members"
+
+SEPARATOR = "\x1f"
+DEFAULT_SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+MIN_PREFIX_LENGTH = 2
+# Products written per Redis pipeline by rebuild_suggestions
+REBUILD_BATCH_SIZE = 500
+
+
+def normalize_text(text):
+    """Lowercase, strip accents and collapse whitespace, as the prefixes typed by shoppers"""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def get_word_suffixes(text):
+    """'red wine bottle' -> ['red wine bottle', 'wine bottle', 'bottle'], to match any word start"""
+    words = normalize_text(text).split(' ')
+    return [' '.join(words[index:]) for index in range(len(words)) if words[index]]
+
+
+def get_index_key(key):
+    return frappe.cache().make_key(key)
+
+
+def make_member(text, kind, key, label, slug=None):
+    return SEPARATOR.join((text, kind, key, label or key, slug or ''))
+
+
+def get_document_members(document):
+    """Return the (member, is_category) completions of a Solr document"""
+    sku = document.get('sku')
+    name = document.get('name')
+    members = []
+    if not sku:
+        return members
+
+    slug = document.get('slug')
+    if name:
+        for text in get_word_suffixes(name):
+            members.append((make_member(text, 'product', sku, name, slug), False))
+    members.append((make_member(normalize_text(sku), 'sku', sku, sku, slug), False))
+
+    group_slugs = []
+    for field in GROUP_FIELDS:
+        group = document.get(field)
+        if not group:
+            break
+        group_slugs.append(slugify_item_group(group))
+        url = ','.join(group_slugs)
+        for text in get_word_suffixes(group):
+            members.append((make_member(text, 'category', url, group), True))
+
+    return members
+
+
+def index_product_suggestions(document):
+    """Add or refresh the completions of one indexed document"""
+    index_products_suggestions([document])
+
+
+def index_products_suggestions(documents):
+    """
+    Add or refresh the completions of a batch of indexed documents.
+
+    Same as index_product_suggestions() for each document, in two Redis round trips:
+    one read of the previous members of the SKUs and one pipeline for every write.
+    """
+    documents = [document for document in documents if document and document.get('sku') and document.get('name')]
+    if not documents:
+        return
+
+    cache = frappe.cache()
+    index_key = get_index_key(SUGGEST_INDEX_KEY)
+    # Raw commands, with the key prefix and pickled values frappe's hget/hset use
+    sku_members_key = cache.make_key(SUGGEST_SKU_MEMBERS_KEY)
+    skus = [document['sku'] for document in documents]
+    previous_members = [pickle.loads(value) for value in cache.hmget(sku_members_key, skus) if value]
+
+    pipeline = cache.pipeline(transaction=False)
+    stale_members = [member for members in previous_members for member in members]
+    if stale_members:
+        pipeline.zrem(index_key, *stale_members)
+    pipeline.hdel(sku_members_key, *skus)
+
+    for document in documents:
+        members = get_document_members(document)
+        if not members:
+            continue
+        pipeline.zadd(index_key, {member: 0 for member, is_category in members})
+        # Category completions are shared by many products, they go away with their Item Group or on a full rebuild
+        product_members = [member for member, is_category in members if not is_category]
+        pipeline.hset(sku_members_key, document['sku'], pickle.dumps(product_members))
+
+    pipeline.execute()
+    # frappe's hget keeps the values it read in the request-local cache
+    getattr(frappe.local, 'cache', {}).pop(sku_members_key, None)
+
+
+def remove_product_suggestions(sku):
+    """Remove the product and SKU completions of a document deleted from the index"""
+    if not sku:
+        return
+
+    cache = frappe.cache()
+    members = cache.hget(SUGGEST_SKU_MEMBERS_KEY, sku)
+    if members:
+        cache.zrem(get_index_key(SUGGEST_INDEX_KEY), *members)
+    cache.hdel(SUGGEST_SKU_MEMBERS_KEY, sku)
+
+
+def remove_category_suggestions(group):
+    """Remove the completions of a category label, found through its word suffixes"""
+    if not group:
+        return
+
+    cache = frappe.cache()
+    index_key = get_index_key(SUGGEST_INDEX_KEY)
+    stale_members = []
+    for text in get_word_suffixes(group):
+        prefix = SEPARATOR.join((text, 'category', '')).encode()
+        for member in cache.zrangebylex(index_key, b"[" + prefix, b"[" + prefix + b"\xff"):
+            member = member.decode() if isinstance(member, bytes) else member
+            if member.split(SEPARATOR)[3] == group:
+                stale_members.append(member)
+
+    if stale_members:
+        cache.zrem(index_key, *stale_members)
+
+
+def item_group_suggestions_on_change(doc, method=None, old_name=None, *args):
+    """Hook on Item Group, drop the completions of a category deleted, renamed or relabelled"""
+    if method == "after_rename":
+        remove_category_suggestions(old_name)
+        return
+
+    groups = {doc.name, doc.get('item_group_name')}
+    if method == "on_update":
+        previous = doc.get_doc_before_save()
+        if not previous:
+            return
+        # The current labels are still valid, only the replaced ones are stale
+        groups = {previous.name, previous.get('item_group_name')} - groups
+
+    for group in groups:
+        remove_category_suggestions(group)
+
+
+def clear_suggestions():
+    cache = frappe.cache()
+    cache.delete(get_index_key(SUGGEST_INDEX_KEY))
+    cache.delete_value(SUGGEST_SKU_MEMBERS_KEY)
+
+
+@frappe.whitelist(methods=['POST'])
+def rebuild_suggestions():
+    """Rebuild the completion index from the whole Solr catalogue"""
+    frappe.only_for("System Manager")
+    from omnicommerce.controllers.solr_search import iter_catalogue
+
+    clear_suggestions()
+    indexed = 0
+    batch = []
+    # Mapped listing products keep the sku, name, slug and group_* keys of the Solr documents
+    for product in iter_catalogue({}, profile='listing'):
+        batch.append(product)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            index_products_suggestions(batch)
+            indexed += len(batch)
+            batch = []
+    index_products_suggestions(batch)
+    indexed += len(batch)
+
+    return {"data": {"indexed": indexed}}
+
+
+@frappe.whitelist(allow_guest=True, methods=['GET'])
+def suggest(term=None, limit=DEFAULT_SUGGEST_LIMIT):
+    """
+    Type-ahead completions for the storefront search box.
+
+    :param term: str - what the shopper typed so far
+    :param limit: int - maximum number of completions
+    :return: dict - completions of type product, sku or category, in alphabetical order
+    """
+    prefix = normalize_text(term or '')
+    if len(prefix) < MIN_PREFIX_LENGTH:
+        return {"data": []}
+
+    limit = min(max(cint(limit) or DEFAULT_SUGGEST_LIMIT, 1), MAX_SUGGEST_LIMIT)
+    cache = frappe.cache()
+
+    # Several members may point to the same product, read a few more than needed.
+    # The upper bound is the prefix followed by the highest byte, so it is built as bytes
+    members = cache.zrangebylex(
+        get_index_key(SUGGEST_INDEX_KEY),
+        f"[{prefix}".encode(),
+        f"[{prefix}".encode() + b"\xff",
+        start=0,
+        num=limit * 4,
+    )
+
+    suggestions = []
+    seen = set()
+    for member in members:
+        member = member.decode() if isinstance(member, bytes) else member
+        text, kind, key, label, slug = member.split(SEPARATOR)
+        if (kind, key) in seen:
+            continue
+        seen.add((kind, key))
+
+        suggestion = {'type': kind, 'label': label}
+        if kind == 'category':
+            suggestion['url'] = key
+        else:
+            suggestion['sku'] = key
+            suggestion['slug'] = slug
+        suggestions.append(suggestion)
+
+        if len(suggestions) >= limit:
+            break
+
+    return {"data": suggestions}
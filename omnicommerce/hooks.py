@@ -145,6 +145,63 @@ doc_events = {
     "Website Item": {
         "on_update": "omnicommerce.controllers.item.website_item_on_update",
         "before_delete": "omnicommerce.controllers.item.website_item_before_delete"
+    },
+    "B2C Menu": {
+        "on_update": [
+            "omnicommerce.controllers.menu_index.b2c_menu_on_change",
+            "omnicommerce.controllers.cdn.catalogue_data_on_change"
+        ],
+        "on_trash": [
+            "omnicommerce.controllers.menu_index.b2c_menu_on_change",
+            "omnicommerce.controllers.cdn.catalogue_data_on_change"
+        ],
+        "after_rename": [
+            "omnicommerce.controllers.menu_index.b2c_menu_on_change",
+            "omnicommerce.controllers.cdn.catalogue_data_on_change"
+        ]
+    },
+    "Blog Post": {
+        "on_update": "omnicommerce.controllers.blog.blog_post_on_change",
+        "on_trash": "omnicommerce.controllers.blog.blog_post_on_change",
+        "after_rename": "omnicommerce.controllers.blog.blog_post_on_change"
+    },
+    "Item Group": {
+        "on_update": [
+            "omnicommerce.controllers.item_group_tree.item_group_on_change",
+            "omnicommerce.controllers.suggest.item_group_suggestions_on_change",
+            "omnicommerce.controllers.cdn.catalogue_data_on_change"
+        ],
+        "on_trash": [
+            "omnicommerce.controllers.item_group_tree.item_group_on_change",
+            "omnicommerce.controllers.suggest.item_group_suggestions_on_change",
+            "omnicommerce.controllers.cdn.catalogue_data_on_change"
+        ],
+        "after_rename": [
+            "omnicommerce.controllers.item_group_tree.item_group_on_change",
+            "omnicommerce.controllers.suggest.item_group_suggestions_on_change",
+            "omnicommerce.controllers.cdn.catalogue_data_on_change"
+        ]
+    },
+    # Only the DocTypes holding the feature UOMs, see feature_cache.FEATURE_DOCTYPES
+    "Item Feature": {
+        "on_update": [
+            "omnicommerce.controllers.feature_cache.feature_doctype_on_change",
+            "omnicommerce.controllers.cdn.feature_data_on_change"
+        ],
+        "on_trash": [
+            "omnicommerce.controllers.feature_cache.feature_doctype_on_change",
+            "omnicommerce.controllers.cdn.feature_data_on_change"
+        ]
+    },
+    "UOM": {
+        "on_update": [
+            "omnicommerce.controllers.feature_cache.feature_doctype_on_change",
+            "omnicommerce.controllers.cdn.feature_data_on_change"
+        ],
+        "on_trash": [
+            "omnicommerce.controllers.feature_cache.feature_doctype_on_change",
+            "omnicommerce.controllers.cdn.feature_data_on_change"
+        ]
     }
 }
 
@@ -201,7 +258,11 @@ doc_events = {
 # Request Events
 # ----------------
 # before_request = ["omnicommerce.utils.before_request"]
-# after_request = ["omnicommerce.utils.after_request"]
+after_request = [
+    "omnicommerce.utils.http_cache.add_http_cache_headers",
+    "omnicommerce.controllers.cdn.add_cdn_headers",
+    "omnicommerce.utils.timing.add_server_timing_header"
+]
 
 # Job Events
 # ----------
@@ -0,0 +1,134 @@
+from frappe.tests.utils import FrappeTestCase
+
+from omnicommerce.controllers.solr_query import SolrQueryBuilder, build_catalogue_query
+from omnicommerce.utils.local_solr import LocalSolr, SearchBackend
+
+DOCUMENTS = [
+    {
+        "id": "1",
+        "sku": "WINE-RED",
+        "name": "Red wine bottle",
+        "group_1": "Drinks",
+        "group_2": "Wine",
+        "net_price_with_vat": 12.5,
+        "availability": 5,
+        "promo_code": "SALE",
+    },
+    {
+        "id": "2",
+        "sku": "WINE-WHITE",
+        "name": "White wine bottle",
+        "group_1": "Drinks",
+        "group_2": "Wine",
+        "net_price_with_vat": 9.9,
+        "availability": 0,
+    },
+    {
+        "id": "3",
+        "sku": "BEER-LAGER",
+        "name": "Lager beer",
+        "group_1": "Drinks",
+        "group_2": "Beer",
+        "net_price_with_vat": 2.4,
+        "availability": 24,
+    },
+    {
+        "id": "4",
+        "sku": "GLASS",
+        "name": "Wine glass",
+        "group_1": "Home",
+        "net_price_with_vat": 30,
+        "availability": 3,
+    },
+]
+
+
+class TestLocalSolr(FrappeTestCase):
+    def setUp(self):
+        self.solr = LocalSolr(":memory:")
+        self.assertEqual(self.solr.add_documents(DOCUMENTS), {"status": "success"})
+        self.solr.commit()
+
+    def tearDown(self):
+        self.solr.connection.close()
+
+    def search_skus(self, **params):
+        return [document["sku"] for document in self.solr.search(**params)["results"]]
+
+    def test_is_a_search_backend(self):
+        self.assertIsInstance(self.solr, SearchBackend)
+        with self.assertRaises(TypeError):
+            SearchBackend()
+
+    def test_text_query_matches_word_prefixes(self):
+        result = self.solr.search(q="text:win", sort="id asc")
+        self.assertEqual(result["hits"], 3)
+        self.assertEqual([document["sku"] for document in result["results"]], ["WINE-RED", "WINE-WHITE", "GLASS"])
+        self.assertEqual(self.solr.search(q="text:*")["hits"], 4)
+
+    def test_query_builder_filters(self):
+        builder = build_catalogue_query({"min_price": "5", "max_price": "20", "is_in_stock": 1})
+        self.assertEqual(self.search_skus(**builder.build()), ["WINE-RED"])
+
+        builder = SolrQueryBuilder().add_terms("sku", ["GLASS", "BEER-LAGER"])
+        self.assertEqual(self.search_skus(**builder.build(), sort="id asc"), ["BEER-LAGER", "GLASS"])
+
+        builder = SolrQueryBuilder().add_term("promo_code", "SALE")
+        self.assertEqual(self.search_skus(**builder.build()), ["WINE-RED"])
+
+        builder = SolrQueryBuilder().add_any_of("sku", ["WINE-WHITE", "GLASS"])
+        self.assertEqual(self.search_skus(**builder.build(), sort="id asc"), ["WINE-WHITE", "GLASS"])
+
+    def test_unknown_filter_syntax_raises(self):
+        with self.assertRaises(ValueError):
+            self.solr.search(fq=["{!geofilt}"])
+
+    def test_group_filter(self):
+        self.assertEqual(self.search_skus(groups="drinks,beer"), ["BEER-LAGER"])
+
+    def test_sort_and_paging(self):
+        self.assertEqual(
+            self.search_skus(sort="net_price_with_vat desc", rows=2, start=1), ["WINE-RED", "WINE-WHITE"]
+        )
+
+    def test_random_sort_is_stable_per_seed(self):
+        first = self.search_skus(sort="random_7 asc", rows=10)
+        self.assertEqual(first, self.search_skus(sort="random_7 asc", rows=10))
+        self.assertCountEqual(first, [document["sku"] for document in DOCUMENTS])
+
+    def test_cursor_paging_walks_every_document_once(self):
+        skus = []
+        cursor_mark = "*"
+        while True:
+            result = self.solr.search(q="text:*", sort="id asc", rows=3, cursorMark=cursor_mark)
+            skus.extend(document["sku"] for document in result["results"])
+            next_cursor_mark = result["response"].nextCursorMark
+            if next_cursor_mark == cursor_mark:
+                break
+            cursor_mark = next_cursor_mark
+
+        self.assertEqual(skus, ["WINE-RED", "WINE-WHITE", "BEER-LAGER", "GLASS"])
+
+    def test_stats(self):
+        stats = self.solr.search(groups="drinks", stats="true", **{"stats.field": "net_price_with_vat"})["response"].stats
+        price = stats["stats_fields"]["net_price_with_vat"]
+        self.assertEqual((price["min"], price["max"], price["count"]), (2.4, 12.5, 3))
+
+    def test_category_facet_counts_the_next_level(self):
+        self.assertEqual(self.solr.search()["facet_counts"]["category"], {"Drinks": 3, "Home": 1})
+        self.assertEqual(self.solr.search(groups="drinks")["facet_counts"]["category"], {"Wine": 2, "Beer": 1})
+        self.assertEqual(self.solr.search(facet="false")["facet_counts"], {})
+
+    def test_field_list(self):
+        result = self.solr.search(fl="sku,name", rows=1, sort="id asc")
+        self.assertEqual(result["results"], [{"sku": "WINE-RED", "name": "Red wine bottle"}])
+
+    def test_update_and_delete(self):
+        self.solr.update_document({"id": "4", "name": {"set": "Beer glass"}})
+        self.assertEqual(self.search_skus(q="text:beer", sort="id asc"), ["BEER-LAGER", "GLASS"])
+
+        self.solr.delete_document("3")
+        self.assertEqual(self.search_skus(q="text:beer"), ["GLASS"])
+
+        self.solr.delete_all_documents()
+        self.assertEqual(self.solr.search()["hits"], 0)
@@ -0,0 +1,68 @@
+from frappe.tests.utils import FrappeTestCase
+
+from omnicommerce.controllers.solr_query import (
+    SolrQueryBuilder,
+    build_catalogue_query,
+    escape_solr_value,
+    format_range_bound,
+)
+
+
+class TestSolrQuery(FrappeTestCase):
+    def test_escape_solr_value(self):
+        self.assertEqual(escape_solr_value("a b"), "a\\ b")
+        self.assertEqual(escape_solr_value("50% (red)"), "50%\\ \\(red\\)")
+        self.assertEqual(escape_solr_value("x:y/z"), "x\\:y\\/z")
+
+    def test_format_range_bound(self):
+        self.assertEqual(format_range_bound(10), "10")
+        self.assertEqual(format_range_bound("12.5"), "12.5")
+        self.assertEqual(format_range_bound(0), "*")
+        self.assertEqual(format_range_bound(None), "*")
+        self.assertEqual(format_range_bound("abc"), "*")
+
+    def test_free_text_stays_in_q(self):
+        builder = SolrQueryBuilder("red wine")
+        self.assertEqual(builder.build(), {"q": "text:red wine"})
+        self.assertEqual(SolrQueryBuilder("").query, "text:*")
+
+    def test_filters_are_not_repeated(self):
+        builder = SolrQueryBuilder().add_term("promo_code", "SALE").add_term("promo_code", "SALE")
+        self.assertEqual(builder.filters, ["promo_code:SALE"])
+
+    def test_add_terms_picks_a_free_separator(self):
+        self.assertEqual(SolrQueryBuilder().add_terms("sku", ["A", "B"]).filters, ["{!terms f=sku}A,B"])
+        self.assertEqual(
+            SolrQueryBuilder().add_terms("sku", ["A,1", "B"]).filters, ['{!terms f=sku separator="|"}A,1|B']
+        )
+
+    def test_add_terms_falls_back_to_escaped_or(self):
+        builder = SolrQueryBuilder().add_terms("sku", ["A,|;1", "B"])
+        self.assertEqual(builder.filters, ["sku:(A,\\|;1 OR B)"])
+
+    def test_add_range(self):
+        self.assertEqual(SolrQueryBuilder().add_range("price", 10, None).filters, ["price:[10 TO *]"])
+        self.assertEqual(SolrQueryBuilder().add_range("price", 0, 0).filters, [])
+
+    def test_build_catalogue_query(self):
+        builder = build_catalogue_query(
+            {
+                "search_term": "wine",
+                "min_price": "10",
+                "max_price": "50",
+                "min_discount_percent": "0",
+                "promo_code": "SALE",
+                "is_in_stock": 1,
+            },
+            skus=["A", "B"],
+        )
+        self.assertEqual(builder.query, "text:wine")
+        self.assertEqual(
+            builder.filters,
+            [
+                "{!terms f=sku}A,B",
+                "net_price_with_vat:[10 TO 50]",
+                "promo_code:SALE",
+                "availability:[1 TO *]",
+            ],
+        )
@@ -0,0 +1,460 @@
+"""
+Micro-benchmarks of the catalogue hot paths.
+
+Run them against a site with:
+
+    bench --site <site> execute omnicommerce.utils.benchmark.benchmark_product_mapper
+    bench --site <site> execute omnicommerce.utils.benchmark.benchmark_json_serializers
+    bench --site <site> execute omnicommerce.utils.benchmark.benchmark_catalogue_suite --kwargs "{'sizes': [10000]}"
+
+benchmark_catalogue_suite runs on the embedded search backend and writes its
+results as JSON, compare two runs with compare_benchmark_results.
+"""
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from itertools import islice
+
+import frappe
+
+DEFAULT_MAPPER_ROWS = (24, 96, 999)
+DEFAULT_SERIALIZER_ROWS = (96, 999)
+DEFAULT_SUITE_SIZES = (10_000, 100_000, 500_000)
+# Website Items indexed through the batched writes of the import path, the rest is bulk loaded
+DEFAULT_INDEX_SAMPLE = 2000
+SUITE_LOAD_BATCH_SIZE = 1000
+DEFAULT_REGRESSION_THRESHOLD = 1.1
+
+# catalogue() arguments measured by the suite, matching the synthetic catalogue
+CATALOGUE_FILTER_MIXES = {
+    'browse': {},
+    'text': {'search_term': 'product'},
+    'category': {'category': 'category-3'},
+    'subcategory_in_stock': {'category': 'category-3,subcategory-3', 'is_in_stock': 1},
+    'price_range': {'min_price': 50, 'max_price': 150},
+    'promo': {'min_discount_percent': 10},
+    'price_sort': {'order_by': 'price-asc'},
+    'deep_page': {'page': 50},
+    'random': {'is_random': 1},
+    'listing_96': {'per_page': 96, 'profile': 'listing'},
+}
+
+
+def make_synthetic_solr_document(index, rng=None):
+    """Build a document shaped like the output of item.transform_to_solr_document"""
+    rng = rng or random.Random(index)
+    sku = f"SKU{index:07d}"
+    name = f"Synthetic product {index}"
+    net_price = round(rng.uniform(1, 500), 2)
+    tax_rate = 22
+    net_price_with_vat = round(net_price * (1 + tax_rate / 100), 2)
+    is_promo = rng.random() < 0.2
+    discount_percent = rng.choice([5, 10, 15, 20, 30]) if is_promo else None
+    gross_price = round(net_price / (1 - discount_percent / 100), 2) if is_promo else net_price
+    gross_price_with_vat = round(gross_price * (1 + tax_rate / 100), 2)
+    num_images = rng.randint(1, 4)
+
+    document = {
+        "id": sku,
+        "sku": sku,
+        "availability": rng.choice([0, rng.randint(1, 500), 100000]),
+        "name": name,
+        "name_nostem": name,
+        "short_description": f"Short description of {name}",
+        "short_description_nostem": f"Short description of {name}",
+        "description": f"Long description of {name}. " * 20,
+        "description_nostem": f"Long description of {name}. " * 20,
+        "num_images": num_images,
+        "images": [f"/files/{sku.lower()}-{image}.jpg" for image in range(num_images)],
+        "slug": f"b2c/synthetic-product-{index}-{sku.lower()}",
+        "discount_value": round(gross_price_with_vat - net_price_with_vat, 2) if is_promo else None,
+        "discount_percent": discount_percent,
+        "tax_rate": tax_rate,
+        "uom": "Nos",
+        "sales_uom_conversion_factor": 1,
+        "sales_uom": "Nos",
+        "gross_price": gross_price,
+        "gross_price_with_vat": gross_price_with_vat,
+        "gross_price_uom": gross_price,
+        "gross_price_uom_with_vat": gross_price_with_vat,
+        "net_price": net_price,
+        "net_price_with_vat": net_price_with_vat,
+        "net_price_uom": net_price,
+        "net_price_uom_with_vat": net_price_with_vat,
+        "promo_code": f"PROMO{index % 7}" if is_promo else None,
+        "promo_price": net_price if is_promo else None,
+        "promo_price_with_vat": net_price_with_vat if is_promo else None,
+        "is_promo": is_promo,
+        "is_best_promo": False,
+        "discount_type": "discount_percentage" if is_promo else None,
+        "group_1": f"Category {index % 8}",
+        "group_2": f"Subcategory {index % 40}",
+        "group_3": f"Family {index % 200}",
+        "family_name": f"Family {index % 200}",
+    }
+    return document
+
+
+def time_call(fn, repeat):
+    """Best wall time of fn over repeat runs, in seconds"""
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_product_mapper(rows=DEFAULT_MAPPER_ROWS, repeat=20, fields=None):
+    """Per-document cost of map_solr_response_b2c at the usual page sizes
+
+    :param rows: list - page sizes to measure
+    :param repeat: int - runs per page size, the best one is kept
+    :param fields: list - Solr fields mapped, as selected by a catalogue profile
+    """
+    from omnicommerce.controllers.solr_search import map_solr_response_b2c
+
+    results = []
+    for row_count in rows:
+        documents = [make_synthetic_solr_document(index) for index in range(int(row_count))]
+        # Warm up the compiled mapper and the media helper
+        map_solr_response_b2c(documents[:1], fields=fields)
+
+        elapsed = time_call(lambda: map_solr_response_b2c(documents, fields=fields), int(repeat))
+        results.append({
+            "rows": int(row_count),
+            "total_ms": round(elapsed * 1000, 3),
+            "per_document_us": round(elapsed * 1_000_000 / int(row_count), 3),
+        })
+
+    for result in results:
+        print(f"{result['rows']:>5} rows: {result['total_ms']:>9} ms total, {result['per_document_us']:>8} us/document")
+
+    return results
+
+
+def make_synthetic_website_item(index):
+    """Build a get_website_items() row, the input of item.transform_to_solr_document"""
+    document = make_synthetic_solr_document(index)
+    modified = datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=index)
+    stock_qty = float(document["availability"]) if document["availability"] != 100000 else 0.0
+    return {
+        "name": document["sku"],
+        "item_code": document["sku"],
+        "item_name": document["name"],
+        "web_item_name": document["name"],
+        "item_group": document["group_3"],
+        "short_description": f"<p>{document['short_description']}</p>",
+        "web_long_description": f"<div><p>{document['description']}</p></div>",
+        "brand": f"Brand {index % 25}",
+        "website_image": document["images"][0],
+        "slideshow": None,
+        "published": 1,
+        "ranking": 0,
+        "creation": modified,
+        "modified": modified,
+        "product_info": {
+            "stock_qty": stock_qty,
+            "in_stock": 1 if stock_qty else 0,
+            "price": {"price_list_rate": Decimal(str(document["gross_price_with_vat"]))},
+        },
+        "groups": frappe._dict(group_1=document["group_1"], group_2=document["group_2"], group_3=document["group_3"]),
+        "prices": {
+            "uom": "Nos",
+            "sales_uom": "Nos",
+            "conversion_factor": 1,
+            "tax_rate": document["tax_rate"],
+            "price_after_pricing_rule_sales_uom_excl_tax": document["net_price"],
+            "price_after_pricing_rule_sales_uom_incl_tax": document["net_price_with_vat"],
+            "initial_price_sales_uom_excl_tax": document["gross_price"],
+            "initial_price_sales_uom_incl_tax": document["gross_price_with_vat"],
+            "is_promo": document["is_promo"],
+            "discount_amount": document["discount_value"],
+            "discount_percent": document["discount_percent"],
+            "promo_code": document["promo_code"],
+        },
+    }
+
+
+def benchmark_json_serializers(rows=DEFAULT_SERIALIZER_ROWS, repeat=20):
+    """Encoding time of catalogue and website item payloads, frappe's encoder against fast_json.dumps
+
+    :param rows: list - products per payload
+    :param repeat: int - runs per payload, the best one is kept
+    """
+    from frappe.utils.response import json_handler
+    from omnicommerce.controllers.solr_search import map_solr_response_b2c
+    from omnicommerce.utils import fast_json
+
+    def frappe_dumps(payload):
+        # What frappe.utils.response.as_json does with frappe.local.response
+        return json.dumps(payload, default=json_handler, separators=(",", ":"))
+
+    results = []
+    for row_count in rows:
+        row_count = int(row_count)
+        documents = [make_synthetic_solr_document(index) for index in range(row_count)]
+        payloads = {
+            "catalogue": {"message": {"totalCount": row_count, "products": map_solr_response_b2c(documents)}},
+            "website_items": {"message": {"data": [make_synthetic_website_item(index) for index in range(row_count)], "count": row_count}},
+        }
+
+        for name, payload in payloads.items():
+            # Both paths must send the same document
+            if json.loads(frappe_dumps(payload)) != json.loads(fast_json.dumps(payload)):
+                frappe.throw(f"fast_json output differs from frappe for the {name} payload")
+
+            frappe_elapsed = time_call(lambda: frappe_dumps(payload), int(repeat))
+            fast_elapsed = time_call(lambda: fast_json.dumps(payload), int(repeat))
+            results.append({
+                "payload": name,
+                "rows": row_count,
+                "encoder": "orjson" if fast_json.orjson else "json",
+                "frappe_ms": round(frappe_elapsed * 1000, 3),
+                "fast_json_ms": round(fast_elapsed * 1000, 3),
+                "speedup": round(frappe_elapsed / fast_elapsed, 2) if fast_elapsed else None,
+            })
+
+    for result in results:
+        print(f"{result['payload']:>13} {result['rows']:>5} rows: frappe {result['frappe_ms']:>9} ms, "
+              f"{result['encoder']} {result['fast_json_ms']:>9} ms, x{result['speedup']}")
+
+    return results
+
+
+def get_app_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=frappe.get_app_path('omnicommerce'), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def local_search_backend(path):
+    """Point get_solr_client() at a LocalSolr database and turn the catalogue cache off"""
+    from omnicommerce.utils.local_solr import close_local_solr
+
+    overrides = {
+        "omnicommerce_search_backend": "sqlite",
+        "omnicommerce_local_solr_path": path,
+        "omnicommerce_catalogue_cache_ttl": 0,
+    }
+    previous = {key: frappe.conf[key] for key in overrides if key in frappe.conf}
+    frappe.conf.update(overrides)
+    try:
+        yield
+    finally:
+        # Keys the site config did not set go away again, a None would read as set
+        for key in overrides:
+            if key in previous:
+                frappe.conf[key] = previous[key]
+            else:
+                frappe.conf.pop(key, None)
+        close_local_solr(path)
+
+
+def summarize_durations(durations):
+    from omnicommerce.utils.timing import percentile
+
+    durations = sorted(duration * 1000 for duration in durations)
+    return {
+        "runs": len(durations),
+        **{f"p{percent}_ms": round(percentile(durations, percent), 3) for percent in (50, 95)},
+        "max_ms": round(durations[-1], 3),
+    }
+
+
+def measure_indexing(size, index_sample):
+    """
+    Index the synthetic catalogue: a sample through the batched writes of the import path, the rest in bulk.
+
+    Only the scratch index is written: the sample skips the upkeep of real imports (catalogue
+    index version, product, slug and suggest caches, CDN purges), which would hit the live site.
+    """
+    from omnicommerce.controllers.item import transform_to_solr_document
+    from omnicommerce.controllers.solr_crud import index_documents_in_solr
+    from omnicommerce.utils.solr_client import get_solr_client
+
+    sample = min(int(index_sample), size)
+    items = [make_synthetic_website_item(index) for index in range(sample)]
+    started_at = time.perf_counter()
+    documents = [document for document in map(transform_to_solr_document, items) if document]
+    results = index_documents_in_solr(documents, upkeep=False)
+    import_elapsed = time.perf_counter() - started_at
+    indexed = sum(1 for document, result in results if result.get('status') == 'success')
+
+    solr = get_solr_client()
+    started_at = time.perf_counter()
+    indexes = iter(range(sample, size))
+    while True:
+        batch = [transform_to_solr_document(make_synthetic_website_item(index)) for index in islice(indexes, SUITE_LOAD_BATCH_SIZE)]
+        if not batch:
+            break
+        solr.add_documents(batch)
+    solr.commit()
+    bulk_elapsed = time.perf_counter() - started_at
+
+    return {
+        "index_documents": {
+            "documents": sample,
+            "summary": {"success": indexed, "failure": len(results) - indexed},
+            "seconds": round(import_elapsed, 3),
+            "documents_per_second": round(sample / import_elapsed, 1) if import_elapsed else None,
+        },
+        "bulk_load": {
+            "documents": size - sample,
+            "seconds": round(bulk_elapsed, 3),
+            "documents_per_second": round((size - sample) / bulk_elapsed, 1) if bulk_elapsed and size > sample else None,
+        },
+    }
+
+
+def measure_catalogue(repeat):
+    from omnicommerce.controllers.solr_search import get_catalogue
+
+    results = {}
+    for name, args in CATALOGUE_FILTER_MIXES.items():
+        durations = []
+        response = None
+        for _ in range(int(repeat)):
+            started_at = time.perf_counter()
+            response = get_catalogue(dict(args))
+            durations.append(time.perf_counter() - started_at)
+        results[name] = {"args": args, "hits": response["totalCount"], **summarize_durations(durations)}
+    return results
+
+
+def measure_mapper(repeat):
+    """map_solr_response_b2c throughput on documents read back from the index"""
+    from omnicommerce.controllers.solr_search import map_solr_response_b2c
+    from omnicommerce.utils.solr_client import get_solr_client
+
+    results = {}
+    for row_count in DEFAULT_MAPPER_ROWS:
+        documents = [dict(document) for document in get_solr_client().search(q='text:*', rows=row_count, facet='false')['results']]
+        if not documents:
+            continue
+        elapsed = time_call(lambda: map_solr_response_b2c(documents), int(repeat))
+        results[str(row_count)] = {
+            "rows": len(documents),
+            "total_ms": round(elapsed * 1000, 3),
+            "documents_per_second": round(len(documents) / elapsed, 1) if elapsed else None,
+        }
+    return results
+
+
+def measure_feed(feed_limit):
+    """Google Merchant feed mapping of the exported catalogue, everything but the upload"""
+    from omnicommerce.controllers.feed_google_merchant import map_google_item
+    from omnicommerce.controllers.solr_search import iter_catalogue
+
+    started_at = time.perf_counter()
+    count = 0
+    for product in islice(iter_catalogue({}, profile='export'), feed_limit):
+        map_google_item(product, 'https://example.com')
+        count += 1
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "products": count,
+        "seconds": round(elapsed, 3),
+        "products_per_second": round(count / elapsed, 1) if elapsed else None,
+    }
+
+
+def benchmark_catalogue_suite(sizes=DEFAULT_SUITE_SIZES, repeat=10, index_sample=DEFAULT_INDEX_SAMPLE, feed_limit=None, output=None):
+    """
+    Index synthetic catalogues of each size in a scratch LocalSolr and measure the hot paths on them:
+    indexing throughput, catalogue() latency per filter mix, mapper throughput and feed generation.
+
+    :param sizes: list - number of synthetic Website Items of each catalogue
+    :param repeat: int - catalogue() calls per filter mix
+    :param index_sample: int - items indexed through index_documents_in_solr, the batched writes of the import path
+    :param feed_limit: int - products mapped for the feed, None for the whole catalogue
+    :param output: str - JSON file of the results, default private/omnicommerce_benchmarks/<time>-<commit>.json
+    :return: dict - the results written to output
+    """
+    from omnicommerce.utils import fast_json
+
+    commit = get_app_commit()
+    started_at = datetime.datetime.now()
+    folder = frappe.get_site_path('private', 'omnicommerce_benchmarks')
+    os.makedirs(folder, exist_ok=True)
+
+    results = {
+        "commit": commit,
+        "started_at": started_at.isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "json_encoder": "orjson" if fast_json.orjson else "json",
+        "repeat": int(repeat),
+        "catalogues": [],
+    }
+
+    for size in sizes:
+        size = int(size)
+        path = os.path.join(folder, f"catalogue-{size}-{frappe.generate_hash(length=6)}.sqlite")
+        try:
+            with local_search_backend(path):
+                run = {"size": size}
+                run["indexing"] = measure_indexing(size, index_sample)
+                run["catalogue"] = measure_catalogue(repeat)
+                run["mapper"] = measure_mapper(repeat)
+                run["feed"] = measure_feed(feed_limit)
+                results["catalogues"].append(run)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+        print(f"{size:>7} items: {run['indexing']['index_documents']['documents_per_second']} docs/s imported, "
+              f"feed {run['feed']['seconds']} s")
+        for name, latency in run["catalogue"].items():
+            print(f"{'':>9}{name:>22}: p50 {latency['p50_ms']:>9} ms, p95 {latency['p95_ms']:>9} ms, {latency['hits']} hits")
+
+    output = output or os.path.join(folder, f"{started_at:%Y%m%d-%H%M%S}-{commit or 'unknown'}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"Results written to {output}")
+
+    return results
+
+
+def compare_benchmark_results(baseline, current, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """
+    Compare the catalogue() p50 of two benchmark_catalogue_suite result files.
+
+    :param baseline: str - JSON file of the reference run
+    :param current: str - JSON file of the run to check
+    :param threshold: float - ratio of current to baseline p50 reported as a regression
+    :return: list - the filter mixes slower than threshold
+    """
+    with open(baseline) as f:
+        baseline = json.load(f)
+    with open(current) as f:
+        current = json.load(f)
+
+    baseline_runs = {run["size"]: run for run in baseline["catalogues"]}
+    regressions = []
+    for run in current["catalogues"]:
+        baseline_run = baseline_runs.get(run["size"])
+        if not baseline_run:
+            continue
+        for name, latency in run["catalogue"].items():
+            baseline_latency = baseline_run["catalogue"].get(name)
+            if not baseline_latency or not baseline_latency["p50_ms"]:
+                continue
+            ratio = latency["p50_ms"] / baseline_latency["p50_ms"]
+            print(f"{run['size']:>7} {name:>22}: {baseline_latency['p50_ms']:>9} -> {latency['p50_ms']:>9} ms, x{ratio:.2f}")
+            if ratio > float(threshold):
+                regressions.append({"size": run["size"], "filter_mix": name, "ratio": round(ratio, 3)})
+
+    return regressions
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+import frappe
+
+
+class VersionedCache:
+    """
+    Worker-local LRU in front of Redis, for data read on every request but rarely changed.
+
+    Entries live under a version token kept in Redis. Rotating the token with invalidate()
+    drops them in every worker at once: the local copies are discarded the next time the
+    token is compared and the Redis copies are never read again and expire on their TTL.
+
+    :param namespace: str - Redis key prefix, unique per cache
+    :param maxsize: int - entries kept in the worker-local layer
+    :param ttl: int - seconds an entry is kept in Redis, None to keep it until invalidated
+    """
+
+    def __init__(self, namespace, maxsize=256, ttl=None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def version_key(self):
+        return f"{self.namespace}:version"
+
+    def get_version(self):
+        version = frappe.cache().get_value(self.version_key)
+        if not version:
+            version = self.invalidate()
+        return version
+
+    def get(self, key, generator):
+        """Return the value cached under key, calling generator() to build it on a miss"""
+        version = self.get_version()
+
+        with self.lock:
+            entry = self.local.get(key)
+            if entry and entry[0] == version:
+                self.local.move_to_end(key)
+                return entry[1]
+
+        redis_key = f"{self.namespace}:{version}:{key}"
+        value = frappe.cache().get_value(redis_key)
+        if value is None:
+            value = generator()
+            frappe.cache().set_value(redis_key, value, expires_in_sec=self.ttl)
+
+        with self.lock:
+            self.local[key] = (version, value)
+            self.local.move_to_end(key)
+            while len(self.local) > self.maxsize:
+                self.local.popitem(last=False)
+
+        return value
+
+    def invalidate(self):
+        version = frappe.generate_hash(length=10)
+        frappe.cache().set_value(self.version_key, version)
+        with self.lock:
+            self.local.clear()
+        return version
@@ -0,0 +1,196 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+import frappe
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_BACKGROUND_TASKS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Best-effort work done after the response, kept apart from the request branches
+_background_executor = None
+_background_slots = None
+
+
+def get_executor():
+    """Thread pool shared by every request served by this worker process"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_workers = int(frappe.conf.get("omnicommerce_max_concurrent_branches") or DEFAULT_MAX_WORKERS)
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="omnicommerce")
+    return _executor
+
+
+def get_background_executor():
+    """Small thread pool and its free slots, for work nobody waits for"""
+    global _background_executor, _background_slots
+    if _background_executor is None:
+        with _executor_lock:
+            if _background_executor is None:
+                max_tasks = int(frappe.conf.get("omnicommerce_max_background_tasks") or DEFAULT_MAX_BACKGROUND_TASKS)
+                _background_slots = threading.BoundedSemaphore(max_tasks)
+                _background_executor = ThreadPoolExecutor(max_workers=max_tasks, thread_name_prefix="omnicommerce-background")
+    return _background_executor, _background_slots
+
+
+def submit_background(fn, *args, **kwargs):
+    """
+    Run fn in the current site off the request thread, without waiting for it.
+
+    When every background slot of the worker is busy the task is dropped and False
+    is returned, so background work never queues up behind a traffic spike.
+    """
+    executor, slots = get_background_executor()
+    if not slots.acquire(blocking=False):
+        return False
+
+    context = get_site_context()
+
+    def run():
+        try:
+            run_in_site_context(context, log_background_errors, fn, *args, **kwargs)
+        finally:
+            slots.release()
+
+    try:
+        executor.submit(run)
+    except RuntimeError:
+        # The pool is shutting down with the worker
+        slots.release()
+        return False
+    return True
+
+
+def log_background_errors(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        frappe.log_error(title=f"Error in background task {getattr(fn, '__name__', fn)}", message=frappe.get_traceback())
+        # Nothing commits after a background task
+        frappe.db.commit()
+
+
+def get_site_context():
+    """Capture what a worker thread needs to rebuild the current Frappe context"""
+    return frappe._dict({
+        "site": frappe.local.site,
+        "sites_path": frappe.local.sites_path,
+        "user": frappe.session.user if getattr(frappe.local, "session", None) else "Guest",
+        "lang": getattr(frappe.local, "lang", None),
+    })
+
+
+def run_in_site_context(context, fn, *args, **kwargs):
+    """
+    Run fn in the Frappe context of context.site, frappe.local is not shared between threads.
+
+    Pool threads keep their context between tasks: the database connection is opened once
+    per thread and reused, so a worker holds at most one connection per pool thread.
+    """
+    ensure_site_context(context)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # End the transaction, the next task starts from a fresh snapshot
+        frappe.db.rollback()
+        clear_request_state()
+
+
+def ensure_site_context(context):
+    """Initialise and connect the current thread for context.site, reusing its open connection"""
+    if getattr(frappe.local, "site", None) == context.site and getattr(frappe.local, "db", None):
+        try:
+            # Also checks that the connection survived the idle time
+            frappe.db.rollback()
+        except Exception:
+            frappe.destroy()
+
+    if getattr(frappe.local, "site", None) != context.site or not getattr(frappe.local, "db", None):
+        if getattr(frappe.local, "site", None):
+            frappe.destroy()
+        frappe.init(site=context.site, sites_path=context.sites_path)
+        frappe.connect()
+
+    frappe.set_user(context.user)
+    if context.lang:
+        frappe.local.lang = context.lang
+
+
+def clear_request_state():
+    """Drop what a task left in frappe.local for its own request: timers, ETags, surrogate keys"""
+    # Iterating a werkzeug Local gives its (name, value) pairs
+    for name in [name for name, value in frappe.local if name.startswith("omnicommerce_")]:
+        delattr(frappe.local, name)
+
+
+def set_statement_timeout(timeout):
+    """Bound the database statements of the current thread in seconds, 0 for no bound.
+
+    A branch past its deadline can not be stopped, but its queries fail instead of
+    holding the pool thread and its connection.
+    """
+    if frappe.db.db_type == "mariadb":
+        frappe.db.sql("SET SESSION max_statement_time = %s", (float(timeout),))
+
+
+class ConcurrentBranches:
+    """Run independent callables at the same time and collect them with a deadline each.
+
+    :param branches: dict - name -> (callable, timeout in seconds, default value)
+
+    The deadline of a branch starts when a pool thread picks it up, not when it is
+    submitted. A branch still queued after its timeout is cancelled, one that raises
+    or runs past its deadline gives back its default value, so one slow sub-query can
+    not hold up the whole response. Branches run without the request: give them their
+    arguments explicitly.
+    """
+
+    def __init__(self, branches):
+        self.branches = branches
+        self.submitted_at = time.monotonic()
+        self.started_at = {}
+        self.started = {name: threading.Event() for name in branches}
+        context = get_site_context()
+        executor = get_executor()
+        self.futures = {
+            name: executor.submit(run_in_site_context, context, self.run_branch, name, fn, timeout)
+            for name, (fn, timeout, default) in branches.items()
+        }
+
+    def run_branch(self, name, fn, timeout):
+        self.started_at[name] = time.monotonic()
+        self.started[name].set()
+        set_statement_timeout(timeout)
+        try:
+            return fn()
+        finally:
+            # The connection goes on to serve other tasks of this thread
+            set_statement_timeout(0)
+
+    def collect(self):
+        results = {}
+        for name, future in self.futures.items():
+            fn, timeout, default = self.branches[name]
+            try:
+                results[name] = future.result(timeout=self.get_remaining_time(name, timeout))
+            except FuturesTimeoutError:
+                # Only a branch that has not started yet can be cancelled
+                future.cancel()
+                frappe.logger("omnicommerce").warning(f"Branch '{name}' did not complete within {timeout}s, using its default value")
+                results[name] = default
+            except Exception:
+                frappe.log_error(title=f"Error in concurrent branch {name}", message=frappe.get_traceback())
+                results[name] = default
+        return results
+
+    def get_remaining_time(self, name, timeout):
+        """Seconds left to the branch: waits for it to start, at most timeout seconds after submission"""
+        queue_wait = max(0, self.submitted_at + timeout - time.monotonic())
+        if not self.started[name].wait(queue_wait):
+            return 0
+        return max(0, self.started_at[name] + timeout - time.monotonic())
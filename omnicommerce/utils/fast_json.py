@@ -0,0 +1,103 @@
+"""
+Fast JSON responses for the large omnicommerce payloads.
+
+orjson is used when it is installed, the stdlib encoder otherwise. Values are
+encoded like frappe.utils.response.json_handler does, so switching
+`omnicommerce_fast_json` on in site config does not change what clients get.
+"""
+import datetime
+import json
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import wraps
+
+import frappe
+from werkzeug.wrappers import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else None
+
+
+def json_default(obj):
+    """Encode the values frappe encodes on top of the JSON types"""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)):
+        # frappe sends str(value), not the ISO format
+        return str(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'as_dict'):
+        return obj.as_dict(no_nulls=True)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Return obj as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=json_default, separators=(',', ':')).encode()
+
+
+def is_fast_json_enabled():
+    return bool(frappe.conf.get("omnicommerce_fast_json"))
+
+
+def as_json_response(data, status=200):
+    """Werkzeug response with the {"message": data} body of a whitelisted method"""
+    return Response(dumps({"message": data}), status=status, mimetype='application/json')
+
+
+def is_requested_method(fn):
+    """True when fn is the whitelisted method the current HTTP request is calling"""
+    if not getattr(frappe.local, 'request', None):
+        return False
+    cmd = (getattr(frappe.local, 'form_dict', None) or {}).get('cmd')
+    return cmd == f"{fn.__module__}.{fn.__name__}"
+
+
+@contextmanager
+def outermost_requested_call(fn, decorator):
+    """
+    Yield True for the call of fn made by the HTTP request, False for any other call.
+
+    A whitelisted method calling itself again, directly or through a helper, is a nested
+    call: only the outermost one is the request. Each decorator keeps its own flag.
+    """
+    active = getattr(frappe.local, 'omnicommerce_active_decorators', None)
+    if active is None:
+        active = frappe.local.omnicommerce_active_decorators = set()
+
+    outermost = decorator not in active and is_requested_method(fn)
+    if outermost:
+        active.add(decorator)
+    try:
+        yield outermost
+    finally:
+        if outermost:
+            active.discard(decorator)
+
+
+def fast_json_response(fn):
+    """
+    Serialize the value of a whitelisted method with dumps() when the site opts in.
+
+    Only the outermost call of the method called by the HTTP request returns a Response:
+    a nested call of the same method, or a call from Python, a thread or a background
+    job, still returns its data, which may be cached.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with outermost_requested_call(fn, 'fast_json_response') as outermost:
+            data = fn(*args, **kwargs)
+        if not outermost or isinstance(data, Response) or not is_fast_json_enabled():
+            return data
+        return as_json_response(data)
+
+    return wrapper
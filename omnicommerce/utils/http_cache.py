@@ -0,0 +1,70 @@
+import hashlib
+import json
+from functools import wraps
+
+import frappe
+from werkzeug.wrappers import Response
+
+from omnicommerce.utils.fast_json import outermost_requested_call
+
+CONDITIONAL_METHODS = ('GET', 'HEAD')
+
+
+def make_etag(*parts):
+    """Strong ETag of everything the response depends on"""
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def get_request_etags():
+    """ETags listed in the If-None-Match header of the current request"""
+    request = getattr(frappe.local, 'request', None)
+    header = request.headers.get('If-None-Match') if request else None
+    if not header:
+        return set()
+    return {etag.strip() for etag in header.split(',') if etag.strip()}
+
+
+def is_not_modified(etag):
+    request = getattr(frappe.local, 'request', None)
+    if not request or request.method not in CONDITIONAL_METHODS:
+        return False
+    etags = get_request_etags()
+    return etag in etags or '*' in etags
+
+
+def conditional_get(get_etag):
+    """
+    Give a whitelisted method an ETag and answer a matching If-None-Match with 304.
+
+    get_etag is called with the arguments of the method and returns the ETag, or None
+    when the response can not be shared. The payload is only built when the client
+    copy is stale. Only applies to the outermost call of the method called by the HTTP request.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with outermost_requested_call(fn, 'conditional_get') as outermost:
+                if not outermost:
+                    return fn(*args, **kwargs)
+
+                etag = get_etag(*args, **kwargs)
+                if etag and is_not_modified(etag):
+                    return Response(status=304, headers={'ETag': etag})
+
+                # Added to the response by add_http_cache_headers
+                frappe.local.omnicommerce_etag = etag
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_http_cache_headers(response=None, request=None):
+    """after_request hook, send the ETag of the response"""
+    etag = getattr(frappe.local, 'omnicommerce_etag', None)
+    if not etag or response is None or response.status_code != 200:
+        return
+
+    response.headers['ETag'] = etag
@@ -0,0 +1,413 @@
+"""
+Embedded stand-in for the Solr core, on SQLite FTS5.
+
+Set `"omnicommerce_search_backend": "sqlite"` in site config and get_solr_client()
+returns a LocalSolr instead of the Solr wrapper, so the catalogue and indexing
+paths run without a Solr server. The database is
+`omnicommerce_local_solr_path` (default: private/omnicommerce_search.sqlite of
+the site), ":memory:" keeps it in memory for the life of the worker.
+
+Only the query syntax omnicommerce itself produces is understood: `text:<words>`
+queries and the filter queries emitted by SolrQueryBuilder. Anything else raises
+a ValueError instead of returning wrong results silently.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+import frappe
+
+from omnicommerce.controllers.item_group_tree import GROUP_FIELDS, GROUP_FIELD_PREFIX, slugify_item_group
+
+# Fields of item.transform_to_solr_document searched by the text: query
+TEXT_FIELDS = (
+    'sku', 'name', 'short_description', 'description', 'keywords', 'model', 'synonymous',
+    *GROUP_FIELDS, 'family_name',
+)
+
+FIELD_NAME = re.compile(r'^\w+$')
+TERMS_FILTER = re.compile(r'^\{!terms f=(?P<field>\w+)(?: separator="(?P<separator>[^"]+)")?\}(?P<values>.*)$', re.S)
+RANGE_FILTER = re.compile(r'^(?P<field>\w+):\[(?P<lower>\S+) TO (?P<upper>\S+)\]$')
+ANY_OF_FILTER = re.compile(r'^(?P<field>\w+):\((?P<values>.*)\)$', re.S)
+TERM_FILTER = re.compile(r'^(?P<field>\w+):(?P<value>.+)$', re.S)
+SOLR_ESCAPE = re.compile(r'\\(.)', re.S)
+RANDOM_SORT_FIELD = re.compile(r'^random_(?P<seed>\d+)$')
+TEXT_TOKEN = re.compile(r'\w+')
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, body TEXT NOT NULL)",
+    # Shares the rowid of documents
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_text USING fts5(text)",
+)
+
+
+class SearchBackend(ABC):
+    """
+    Calls omnicommerce makes to its search index, as implemented by the Solr wrapper.
+
+    search() returns a dict with `hits`, `results` (documents), `response` (an object
+    with `hits`, `stats` and `nextCursorMark`) and `facet_counts`. Writes return
+    {'status': 'success'} or {'status': 'failure', 'reason': ...}.
+    """
+
+    @abstractmethod
+    def search(self, **params):
+        pass
+
+    @abstractmethod
+    def add_documents(self, documents):
+        pass
+
+    @abstractmethod
+    def update_document(self, document):
+        pass
+
+    @abstractmethod
+    def delete_document(self, id):
+        pass
+
+    @abstractmethod
+    def delete_all_documents(self):
+        pass
+
+    @abstractmethod
+    def commit(self):
+        pass
+
+
+class LocalResults:
+    """The parts of pysolr.Results read by omnicommerce"""
+
+    def __init__(self, docs, hits, stats=None, next_cursor_mark=None):
+        self.docs = docs
+        self.hits = hits
+        self.stats = stats or {}
+        self.nextCursorMark = next_cursor_mark
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    def __len__(self):
+        return len(self.docs)
+
+
+def unescape_solr_value(value):
+    return SOLR_ESCAPE.sub(r'\1', value)
+
+
+def normalize_term(value):
+    """Solr booleans are stored as JSON true/false, SQLite reads them back as 1/0"""
+    return {'true': '1', 'false': '0'}.get(value, value)
+
+
+def check_field_name(field):
+    if not FIELD_NAME.match(field or ''):
+        raise ValueError(f"Invalid field name: {field!r}")
+    return field
+
+
+def json_path(field):
+    return f"$.{check_field_name(field)}"
+
+
+def random_order(seed, id):
+    """Deterministic order of a document for a seed, as Solr's RandomSortField"""
+    return hashlib.md5(f"{seed}:{id}".encode()).hexdigest()
+
+
+def slugify_group(value):
+    """slugify_item_group() for SQLite, which passes NULL for missing groups"""
+    return slugify_item_group(str(value)) if value is not None else None
+
+
+def get_local_solr_path():
+    return frappe.conf.get("omnicommerce_local_solr_path") or frappe.get_site_path('private', 'omnicommerce_search.sqlite')
+
+
+class LocalSolr(SearchBackend):
+    """SQLite FTS5 implementation of SearchBackend, safe to share between threads"""
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.create_function('random_order', 2, random_order, deterministic=True)
+        self.connection.create_function('slugify_group', 1, slugify_group, deterministic=True)
+        with self.lock:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+            self.connection.commit()
+
+    # Writes
+
+    def add_documents(self, documents):
+        try:
+            with self.lock:
+                for document in documents:
+                    self.write_document(document)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            return {'status': 'failure', 'reason': str(e)}
+        return {'status': 'success'}
+
+    def update_document(self, document):
+        """Merge the fields of document into the indexed one, atomic update {'set': value} included"""
+        try:
+            with self.lock:
+                row = self.connection.execute("SELECT body FROM documents WHERE id = ?", (str(document['id']),)).fetchone()
+                merged = json.loads(row['body']) if row else {}
+                for field, value in document.items():
+                    if isinstance(value, dict) and 'set' in value:
+                        value = value['set']
+                    merged[field] = value
+                self.write_document(merged)
+        except (KeyError, sqlite3.Error, TypeError, ValueError) as e:
+            return {'status': 'failure', 'reason': str(e)}
+        return {'status': 'success'}
+
+    def delete_document(self, id):
+        with self.lock:
+            row = self.connection.execute("SELECT rowid FROM documents WHERE id = ?", (str(id),)).fetchone()
+            if row:
+                self.connection.execute("DELETE FROM documents_text WHERE rowid = ?", (row[0],))
+                self.connection.execute("DELETE FROM documents WHERE rowid = ?", (row[0],))
+        return {'status': 'success'}
+
+    def delete_all_documents(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM documents")
+            self.connection.execute("DELETE FROM documents_text")
+        return {'status': 'success'}
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+        return {'status': 'success'}
+
+    def write_document(self, document):
+        id = str(document['id'])
+        text = ' '.join(str(document[field]) for field in TEXT_FIELDS if document.get(field))
+        body = json.dumps(document, default=str)
+
+        row = self.connection.execute("SELECT rowid FROM documents WHERE id = ?", (id,)).fetchone()
+        if row:
+            rowid = row[0]
+            self.connection.execute("UPDATE documents SET body = ? WHERE rowid = ?", (body, rowid))
+            self.connection.execute("DELETE FROM documents_text WHERE rowid = ?", (rowid,))
+        else:
+            rowid = self.connection.execute("INSERT INTO documents (id, body) VALUES (?, ?)", (id, body)).lastrowid
+        self.connection.execute("INSERT INTO documents_text (rowid, text) VALUES (?, ?)", (rowid, text))
+
+    # Search
+
+    def search(self, **params):
+        where, where_params = self.build_where(params)
+        order_by = self.build_order_by(params.get('sort'))
+        rows = int(params.get('rows', 10))
+
+        cursor_mark = params.get('cursorMark')
+        start = int(cursor_mark) if cursor_mark and cursor_mark != '*' else int(params.get('start', 0))
+
+        with self.lock:
+            hits = self.connection.execute(f"SELECT COUNT(*) FROM documents WHERE {where}", where_params).fetchone()[0]
+            rows_found = self.connection.execute(
+                f"SELECT body FROM documents WHERE {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                [*where_params, rows, start],
+            ).fetchall()
+            stats = self.get_stats(params, where, where_params)
+            facet_counts = self.get_facet_counts(params, where, where_params)
+
+        fields = self.get_field_list(params.get('fl'))
+        docs = []
+        for row in rows_found:
+            document = json.loads(row['body'])
+            if fields:
+                document = {field: document[field] for field in fields if field in document}
+            docs.append(document)
+
+        next_cursor_mark = None
+        if cursor_mark:
+            # As Solr, the same mark once the end is reached
+            next_cursor_mark = str(start + len(docs)) if docs else cursor_mark
+
+        return {
+            'hits': hits,
+            'results': docs,
+            'response': LocalResults(docs, hits, stats, next_cursor_mark),
+            'facet_counts': facet_counts,
+        }
+
+    def build_where(self, params):
+        conditions = []
+        values = []
+
+        text = (params.get('q') or 'text:*').split(':', 1)[-1]
+        tokens = TEXT_TOKEN.findall(text)
+        if tokens:
+            conditions.append("rowid IN (SELECT rowid FROM documents_text WHERE documents_text MATCH ?)")
+            values.append(' '.join(f'"{token}"*' for token in tokens))
+
+        filters = params.get('fq') or []
+        if isinstance(filters, str):
+            filters = [filters]
+        for clause in filters:
+            condition, condition_values = self.parse_filter(clause)
+            conditions.append(condition)
+            values.extend(condition_values)
+
+        for condition, condition_values in self.get_wrapper_filters(params):
+            conditions.append(condition)
+            values.extend(condition_values)
+
+        return ' AND '.join(conditions) or '1', values
+
+    def parse_filter(self, clause):
+        """SQL condition of a filter query emitted by SolrQueryBuilder"""
+        match = TERMS_FILTER.match(clause)
+        if match:
+            values = match.group('values').split(match.group('separator') or ',')
+            return self.any_of_condition(match.group('field'), values)
+
+        match = RANGE_FILTER.match(clause)
+        if match:
+            field = match.group('field')
+            condition = [f"json_extract(body, '{json_path(field)}') IS NOT NULL"]
+            values = []
+            for bound, operator in (('lower', '>='), ('upper', '<=')):
+                value = match.group(bound)
+                if value != '*':
+                    condition.append(f"CAST(json_extract(body, '{json_path(field)}') AS REAL) {operator} ?")
+                    values.append(float(value))
+            return f"({' AND '.join(condition)})", values
+
+        match = ANY_OF_FILTER.match(clause)
+        if match:
+            values = [unescape_solr_value(value) for value in re.split(r'(?<!\\) OR ', match.group('values'))]
+            return self.any_of_condition(match.group('field'), values)
+
+        match = TERM_FILTER.match(clause)
+        if match:
+            return self.any_of_condition(match.group('field'), [unescape_solr_value(match.group('value'))])
+
+        raise ValueError(f"Filter query not supported by the local search backend: {clause!r}")
+
+    def any_of_condition(self, field, values):
+        # json_each walks multi-valued fields and returns scalars as a single row
+        values = [normalize_term(str(value)) for value in values]
+        placeholders = ', '.join('?' for _ in values)
+        condition = (
+            f"EXISTS (SELECT 1 FROM json_each(documents.body, '{json_path(field)}') "
+            f"WHERE CAST(value AS TEXT) IN ({placeholders}))"
+        )
+        return condition, values
+
+    def get_wrapper_filters(self, params):
+        """The groups/family filters the Solr wrapper turns into filter queries"""
+        groups = params.get('groups')
+        if groups:
+            for index, slug in enumerate(str(groups).split(','), start=1):
+                if slug:
+                    yield f"slugify_group(json_extract(body, '$.{GROUP_FIELD_PREFIX}{index}')) = ?", [slug.lower()]
+
+        for field in ('family_code', 'family_name'):
+            if params.get(field):
+                yield self.any_of_condition(field, [params[field]])
+
+        if params.get('features'):
+            frappe.logger("omnicommerce").warning("Feature filters are ignored by the local search backend")
+
+    def build_order_by(self, sort):
+        clauses = []
+        for part in (sort or '').split(','):
+            part = part.strip()
+            if not part:
+                continue
+            field, _, direction = part.partition(' ')
+            direction = 'DESC' if direction.strip().lower() == 'desc' else 'ASC'
+
+            if field == 'score':
+                continue
+            random_field = RANDOM_SORT_FIELD.match(field)
+            if random_field:
+                clauses.append(f"random_order({int(random_field.group('seed'))}, id) {direction}")
+                continue
+
+            value = f"json_extract(body, '{json_path(field)}')"
+            # Documents without the field go last, as sortMissingLast
+            clauses.append(f"({value} IS NULL), {value} {direction}")
+
+        clauses.append("id ASC")
+        return ', '.join(clauses)
+
+    def get_field_list(self, fl):
+        if not fl:
+            return None
+        fields = fl.split(',') if isinstance(fl, str) else list(fl)
+        fields = [field.strip() for field in fields if field.strip() and field.strip() != 'score']
+        return None if '*' in fields else fields
+
+    def get_stats(self, params, where, where_params):
+        if str(params.get('stats')).lower() != 'true' or not params.get('stats.field'):
+            return {}
+
+        stats_fields = params['stats.field']
+        stats_fields = [stats_fields] if isinstance(stats_fields, str) else stats_fields
+        result = {}
+        for field in stats_fields:
+            value = f"CAST(json_extract(body, '{json_path(field)}') AS REAL)"
+            row = self.connection.execute(
+                f"SELECT MIN({value}), MAX({value}), COUNT({value}), SUM({value}) FROM documents "
+                f"WHERE {where} AND json_extract(body, '{json_path(field)}') IS NOT NULL",
+                where_params,
+            ).fetchone()
+            count = row[2]
+            result[field] = {
+                'min': row[0],
+                'max': row[1],
+                'count': count,
+                'sum': row[3],
+                'mean': row[3] / count if count else None,
+            }
+        return {'stats_fields': result}
+
+    def get_facet_counts(self, params, where, where_params):
+        """Counts of the next category level below the selected groups, the only facet computed locally"""
+        if str(params.get('facet')).lower() == 'false':
+            return {}
+
+        level = len([slug for slug in str(params.get('groups') or '').split(',') if slug]) + 1
+        value = f"json_extract(body, '$.{GROUP_FIELD_PREFIX}{level}')"
+        rows = self.connection.execute(
+            f"SELECT {value} AS value, COUNT(*) AS count FROM documents WHERE {where} AND {value} IS NOT NULL "
+            f"GROUP BY {value} ORDER BY count DESC, value ASC",
+            where_params,
+        ).fetchall()
+        return {
+            'category': {row['value']: row['count'] for row in rows},
+            'features': {},
+        }
+
+
+_local_solr_lock = threading.Lock()
+_local_solr = {}
+
+
+def get_local_solr():
+    """LocalSolr of the configured database, one per worker and path"""
+    path = get_local_solr_path()
+    with _local_solr_lock:
+        if path not in _local_solr:
+            _local_solr[path] = LocalSolr(path)
+        return _local_solr[path]
+
+
+def close_local_solr(path):
+    """Close and forget the LocalSolr of path, before its database file is removed"""
+    with _local_solr_lock:
+        local_solr = _local_solr.pop(path, None)
+    if local_solr is not None:
+        with local_solr.lock:
+            local_solr.connection.close()
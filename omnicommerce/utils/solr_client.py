@@ -0,0 +1,83 @@
+import threading
+
+import frappe
+from mymb_ecommerce.utils.Solr import Solr
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_SOLR_POOL_SIZE = 16
+DEFAULT_SOLR_CONNECT_TIMEOUT = 3
+DEFAULT_SOLR_READ_TIMEOUT = 10
+DEFAULT_SOLR_RETRIES = 2
+
+_client_lock = threading.Lock()
+# solr_url -> client of this worker, one per Solr core of the sites it serves
+_clients = {}
+
+
+def get_solr_url():
+    return frappe.get_cached_doc('Mymb Settings').get('solr_url')
+
+
+def get_solr_session():
+    """requests session with a keep-alive connection pool and retries on the transient Solr errors"""
+    retry = Retry(
+        total=int(frappe.conf.get("omnicommerce_solr_retries", DEFAULT_SOLR_RETRIES)),
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        # Updates are not idempotent for every document type, only searches are retried
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+    pool_size = int(frappe.conf.get("omnicommerce_solr_pool_size") or DEFAULT_SOLR_POOL_SIZE)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+    session = Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_solr_timeout():
+    """(connect, read) timeout in seconds of the Solr requests"""
+    return (
+        float(frappe.conf.get("omnicommerce_solr_connect_timeout") or DEFAULT_SOLR_CONNECT_TIMEOUT),
+        float(frappe.conf.get("omnicommerce_solr_read_timeout") or DEFAULT_SOLR_READ_TIMEOUT),
+    )
+
+
+def build_solr_client(solr_url):
+    client = Solr(solr_url)
+
+    # The wrapper keeps its pysolr.Solr on `solr`, which sends every request through
+    # its `session` with its `timeout`: give it the pooled session
+    pysolr_client = getattr(client, 'solr', None)
+    if pysolr_client is not None and hasattr(pysolr_client, 'session'):
+        pysolr_client.session = get_solr_session()
+        pysolr_client.timeout = get_solr_timeout()
+
+    return client
+
+
+def get_solr_client():
+    """
+    Solr client shared by every request and thread of this worker.
+
+    Keeps the HTTP connections alive between requests. Clients are kept per Solr URL,
+    so a worker serving several sites keeps one for each of their cores. With
+    `omnicommerce_search_backend` set to "sqlite" the embedded LocalSolr is returned instead.
+    """
+    if frappe.conf.get("omnicommerce_search_backend") == "sqlite":
+        from omnicommerce.utils.local_solr import get_local_solr
+        return get_local_solr()
+
+    solr_url = get_solr_url()
+    client = _clients.get(solr_url)
+    if client is not None:
+        return client
+
+    with _client_lock:
+        if solr_url not in _clients:
+            _clients[solr_url] = build_solr_client(solr_url)
+        return _clients[solr_url]
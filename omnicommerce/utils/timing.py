@@ -0,0 +1,145 @@
+import json
+import random
+import time
+from contextlib import contextmanager
+
+import frappe
+
+TIMINGS_LOG_KEY = "omnicommerce:timings"
+TIMINGS_LOG_SIZE = 2000
+DEFAULT_TIMING_SAMPLE_RATE = 0.05
+PERCENTILES = (50, 95, 99)
+
+
+class StageTimer:
+    """Wall time spent in each stage of one request, in milliseconds"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started_at = time.perf_counter()
+        self.returned_at = None
+        self.stages = {}
+        self.depth = 0
+
+    @contextmanager
+    def stage(self, name):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started_at) * 1000
+            self.stages[name] = self.stages.get(name, 0) + elapsed
+
+    def as_dict(self):
+        timings = {name: round(duration, 3) for name, duration in self.stages.items()}
+        end = self.returned_at or time.perf_counter()
+        timings['total'] = round((end - self.started_at) * 1000, 3)
+        return timings
+
+    def as_server_timing(self):
+        return ', '.join(f'{name};dur={duration:.1f}' for name, duration in self.as_dict().items())
+
+
+def get_request_timer():
+    return getattr(frappe.local, 'omnicommerce_timer', None)
+
+
+@contextmanager
+def timed_endpoint(endpoint):
+    """Time a whitelisted endpoint, nested calls made in the same request share the outer timer"""
+    timer = get_request_timer()
+    # A timer left by a finished call starts over: background jobs and threads keep frappe.local between calls
+    if timer is None or not timer.depth:
+        timer = frappe.local.omnicommerce_timer = StageTimer(endpoint)
+
+    timer.depth += 1
+    try:
+        yield timer
+    finally:
+        timer.depth -= 1
+        if timer.depth == 0:
+            timer.returned_at = time.perf_counter()
+
+
+@contextmanager
+def timing_stage(name):
+    """Add the time spent in the block to the current request timer, if any"""
+    timer = get_request_timer()
+    if timer is None:
+        yield
+        return
+
+    with timer.stage(name):
+        yield
+
+
+def is_timing_debug_enabled():
+    return bool(frappe.conf.get("omnicommerce_debug_timings") or frappe.conf.get("developer_mode"))
+
+
+def with_debug_timings(response, timer):
+    """In debug mode return a copy of response with a `_timings` key, once the outer endpoint is done"""
+    if timer.depth or not is_timing_debug_enabled() or not isinstance(response, dict):
+        return response
+    return {**response, '_timings': timer.as_dict()}
+
+
+def add_server_timing_header(response=None, request=None):
+    """after_request hook, report the stages in the Server-Timing header and sample them"""
+    timer = get_request_timer()
+    if timer is None or response is None:
+        return
+
+    if timer.returned_at:
+        # Everything after the endpoint returned: JSON encoding and response building
+        timer.stages['respond'] = (time.perf_counter() - timer.returned_at) * 1000
+        timer.returned_at = time.perf_counter()
+
+    response.headers['Server-Timing'] = timer.as_server_timing()
+    sample_timings(timer)
+
+
+def sample_timings(timer):
+    """Keep a sample of the request timings in a capped Redis list"""
+    sample_rate = float(frappe.conf.get("omnicommerce_timing_sample_rate", DEFAULT_TIMING_SAMPLE_RATE) or 0)
+    if random.random() >= sample_rate:
+        return
+
+    record = json.dumps({'endpoint': timer.endpoint, 'timings': timer.as_dict()})
+    frappe.cache().lpush(TIMINGS_LOG_KEY, record)
+    frappe.cache().ltrim(TIMINGS_LOG_KEY, 0, TIMINGS_LOG_SIZE - 1)
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+@frappe.whitelist(methods=['GET'])
+def get_stage_latency_percentiles(endpoint=None):
+    """p50/p95/p99 per stage of the sampled requests, in milliseconds"""
+    frappe.only_for("System Manager")
+
+    durations = {}
+    for record in frappe.cache().lrange(TIMINGS_LOG_KEY, 0, -1):
+        record = json.loads(record)
+        if endpoint and record['endpoint'] != endpoint:
+            continue
+        stages = durations.setdefault(record['endpoint'], {})
+        for stage, duration in record['timings'].items():
+            stages.setdefault(stage, []).append(duration)
+
+    result = {}
+    for endpoint_name, stages in durations.items():
+        result[endpoint_name] = {}
+        for stage, values in stages.items():
+            values.sort()
+            result[endpoint_name][stage] = {
+                'samples': len(values),
+                **{f'p{percent}': percentile(values, percent) for percent in PERCENTILES},
+            }
+
+    return {"data": result}